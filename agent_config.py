@@ -3,8 +3,8 @@ Dynamic Agent Configuration Management
 Handles greeting messages, exit messages, and prompt configurations
 """
 
-import json
 import os
+import orjson
 from typing import Dict, Any
 from datetime import datetime
 
@@ -26,18 +26,23 @@ class AgentConfig:
         }
         self.config = self.load_config()
 
-        # Initialize last modified timestamp for config reload tracking
-        if os.path.exists(self.config_file_path):
-            self._last_modified = os.path.getmtime(self.config_file_path)
-        else:
-            self._last_modified = 0
+        # (mtime_ns, size) of the file as last loaded/saved; one stat per read detects edits
+        self._last_modified = self.file_signature()
+
+    def file_signature(self):
+        """(mtime_ns, size) of the config file, or None if it does not exist"""
+        try:
+            st = os.stat(self.config_file_path)
+            return st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
 
     def load_config(self) -> Dict[str, Any]:
         """Load configuration from file or create with defaults"""
         try:
             if os.path.exists(self.config_file_path):
-                with open(self.config_file_path, 'r', encoding='utf-8') as f:
-                    config = json.load(f)
+                with open(self.config_file_path, 'rb') as f:
+                    config = orjson.loads(f.read())
                     # Merge with defaults to ensure all keys exist
                     return {**self.default_config, **config}
             else:
@@ -54,8 +59,13 @@ class AgentConfig:
             config_to_save = config or self.config
             config_to_save["last_updated"] = datetime.now().isoformat()
 
-            with open(self.config_file_path, 'w', encoding='utf-8') as f:
-                json.dump(config_to_save, f, indent=2, ensure_ascii=False)
+            # Write to a temp file and swap it in, so readers never see half-written JSON
+            tmp_path = f"{self.config_file_path}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(orjson.dumps(config_to_save, option=orjson.OPT_INDENT_2))
+            os.replace(tmp_path, self.config_file_path)
+            # Our own write is already in memory; don't re-parse it on the next read
+            self._last_modified = self.file_signature()
 
             if config:
                 self.config = config_to_save
@@ -77,21 +87,15 @@ class AgentConfig:
 
     def _needs_reload(self) -> bool:
         """Check if config file has been modified since last load"""
-        try:
-            if os.path.exists(self.config_file_path):
-                current_modified = os.path.getmtime(self.config_file_path)
-                return current_modified > self._last_modified
-            return False
-        except Exception:
-            return True  # If we can't check, assume we need to reload
+        signature = self.file_signature()
+        return signature is not None and signature != self._last_modified
 
     def reload_config(self) -> bool:
         """Reload configuration from file if it has been modified"""
         try:
             if self._needs_reload():
                 self.config = self.load_config()
-                if os.path.exists(self.config_file_path):
-                    self._last_modified = os.path.getmtime(self.config_file_path)
+                self._last_modified = self.file_signature()
                 return True
             return True  # No reload needed
         except Exception as e:
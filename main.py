@@ -10,6 +10,13 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from routers import config_api, calls_api, webhook_api, websocket_api, leads_api_mongo, inbound_api
 
+# uvloop ships with uvicorn[standard] on Linux; fall back to asyncio elsewhere (e.g. Windows)
+try:
+    import uvloop  # noqa: F401
+    EVENT_LOOP = "uvloop"
+except ImportError:
+    EVENT_LOOP = "asyncio"
+
 # Create FastAPI app
 app = FastAPI(
     title="AI Agent Backend",
@@ -61,5 +68,6 @@ if __name__ == "__main__":
         "main:app",
         host="0.0.0.0",
         port=port,
+        loop=EVENT_LOOP,
         reload=False  # Set to False for production
     )
@@ -12,6 +12,31 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+try:
+    import zstandard  # noqa: F401  (enables PyMongo's zstd wire compression)
+    MONGO_COMPRESSORS = "zstd,zlib"
+except ImportError:
+    MONGO_COMPRESSORS = "zlib"
+
+# Pool sized for webhook bursts: warm connections ready, and a short wait for a free
+# one so a saturated pool fails fast instead of stalling the request
+MONGO_POOL_OPTIONS = {
+    "maxPoolSize": 256,
+    "minPoolSize": 16,
+    "waitQueueTimeoutMS": 500,
+    "retryWrites": True,
+    "compressors": MONGO_COMPRESSORS,
+}
+
+_PHONE_DEL = str.maketrans('', '', '+- ')
+PHONE_BACKFILL_MIGRATION = "leads_phone_normalized_backfill"  # _id of its marker in db.migrations
+
+def normalize_phone(phone) -> str:
+    """Canonical lead phone key (stored as phone_normalized): '+', '-' and spaces stripped"""
+    if not phone:
+        return ""
+    return str(phone).translate(_PHONE_DEL)
+
 class MongoDBClient:
     def __init__(self):
         # Get MongoDB Atlas connection string from environment
@@ -27,23 +52,32 @@ class MongoDBClient:
         
         try:
             print("Connecting to MongoDB Atlas...")
-            self.client = MongoClient(self.mongo_uri)
+            self.client = MongoClient(self.mongo_uri, **MONGO_POOL_OPTIONS)
             self.db = self.client[self.database_name]
             
             # Initialize collections
             self.leads = self.db.leads
             self.calls = self.db.calls
+            self.webhook_events = self.db.webhook_events
+            self.pending_hangups = self.db.pending_hangups
             
             # Create indexes for better performance
             self.leads.create_index("phone", unique=True)
             self.leads.create_index("email")
             self.leads.create_index("status")
             self.leads.create_index("created_at")
+            # Point lookups by normalized phone (webhook events)
+            # The trailing keys match the webhook's LEAD_FIELDS projection, so that lookup is
+            # answered from the index alone (covered query) without fetching the lead document
+            self.leads.create_index([("phone_normalized", 1), ("_id", 1), ("name", 1), ("status", 1)])
+            self.backfill_phone_normalized()
             
             self.calls.create_index("lead_id")
             self.calls.create_index("phone_number")
             self.calls.create_index("call_date")
             self.calls.create_index("status")
+            # Covers the session-id -> recently initiated call lookup in the WebSocket handler
+            self.calls.create_index([("call_session_id", 1), ("status", 1), ("created_at", -1)])
             # Unique session id to deduplicate multiple WS reconnects for the same call
             try:
                 self.calls.create_index("call_session_id", unique=True, sparse=True)
@@ -51,6 +85,12 @@ class MongoDBClient:
                 # Index may already exist
                 pass
             
+            # Provider webhook retries: one record per call_id:event, kept for a day
+            self.webhook_events.create_index("event_key", unique=True)
+            self.webhook_events.create_index("ts", expireAfterSeconds=86400)
+            self.pending_hangups.create_index("call_id", unique=True)
+            self.pending_hangups.create_index("expires_at", expireAfterSeconds=0)
+            
             print("MongoDB connected successfully")
             
         except Exception as e:
@@ -58,6 +98,27 @@ class MongoDBClient:
             self.client = None
             self.db = None
     
+    def backfill_phone_normalized(self):
+        """
+        One-time: set phone_normalized on leads created before the field existed.
+        A marker document records that it ran, so later starts skip the collection scan.
+        """
+        if self.db.migrations.find_one({"_id": PHONE_BACKFILL_MIGRATION}):
+            return
+        print("Backfilling phone_normalized on existing leads...")
+        result = self.leads.update_many(
+            {"phone_normalized": {"$exists": False}, "phone": {"$exists": True}},
+            [{"$set": {"phone_normalized": {"$replaceAll": {"input": {"$replaceAll": {"input": {"$replaceAll": {
+                "input": {"$toString": "$phone"}, "find": "+", "replacement": ""}},
+                "find": "-", "replacement": ""}}, "find": " ", "replacement": ""}}}}]
+        )
+        self.db.migrations.update_one(
+            {"_id": PHONE_BACKFILL_MIGRATION},
+            {"$set": {"applied_at": datetime.now(), "modified": result.modified_count}},
+            upsert=True
+        )
+        print(f"Backfilled phone_normalized on {result.modified_count} leads")
+
     def is_connected(self) -> bool:
         """Check if MongoDB is connected"""
         return self.client is not None
@@ -3,6 +3,10 @@ from typing import Any, Dict, List
 import json
 
 class DynamicQA:
+    # Canned replies get_response returns when the LLM is not configured
+    SERVICE_NOT_CONFIGURED_REPLY = "I'm sorry, the AI service is not properly configured."
+    API_KEY_NOT_CONFIGURED_REPLY = "I'm sorry, the AI service API key is not configured."
+
     def __init__(self, ai_services):
         self.ai_services = ai_services
         self.agent_config = agent_config
@@ -186,12 +190,12 @@ class DynamicQA:
             # Check if Groq client is properly initialized
             if not hasattr(self.ai_services, 'groq_client') or self.ai_services.groq_client is None:
                 print("❌ Groq client is not initialized")
-                return "I'm sorry, the AI service is not properly configured."
+                return self.SERVICE_NOT_CONFIGURED_REPLY
             
             # Check if API key is set
             if not self.ai_services.config.GROQ_API_KEY or self.ai_services.config.GROQ_API_KEY == "your_groq_api_key_here":
                 print("❌ GROQ_API_KEY is not set or is using placeholder value")
-                return "I'm sorry, the AI service API key is not configured."
+                return self.API_KEY_NOT_CONFIGURED_REPLY
             
             system_prompt = self.build_system_prompt()
             print(f"System Prompt: {system_prompt[:200]}...")  # Print first 200 chars for debugging
@@ -232,6 +236,11 @@ class DynamicQA:
         available = ", ".join([k.replace('_', ' ') for k in kb.keys()])
         return f"I can help you with: {available}. What would you like to know?"
 
+    def is_fallback(self, user_input: str, reply: str) -> bool:
+        """Check if reply is canned text from get_response rather than an LLM answer"""
+        return (reply in (self.SERVICE_NOT_CONFIGURED_REPLY, self.API_KEY_NOT_CONFIGURED_REPLY)
+                or reply == self._dynamic_fallback(user_input))
+
     def is_exit_intent(self, user_input: str) -> bool:
         """Check if user wants to exit"""
         user_input = user_input.lower()
@@ -15,7 +15,7 @@ import time
 from dotenv import load_dotenv
 from bson import ObjectId
 from piopiy import RestClient, Action
-from mongo_client import mongo_client
+from mongo_client import mongo_client, normalize_phone
 from routers.calls_api import log_call, update_lead_status_from_call
 
 load_dotenv()
@@ -182,6 +182,7 @@ def add_lead(lead_data: Dict):
     lead_doc = {
         "name": lead_data["name"],
         "phone": lead_data["phone"],
+        "phone_normalized": normalize_phone(lead_data["phone"]),
         "email": lead_data.get("email", ""),
         "company": lead_data.get("company", ""),
         "notes": lead_data.get("notes", ""),
@@ -216,6 +217,7 @@ def update_lead(lead_id: str, lead_data: Dict):
     update_data = {
         "name": lead_data["name"],
         "phone": lead_data["phone"],
+        "phone_normalized": normalize_phone(lead_data["phone"]),
         "email": lead_data.get("email", ""),
         "company": lead_data.get("company", ""),
         "notes": lead_data.get("notes", ""),
@@ -343,6 +345,7 @@ async def upload_leads_csv(file: UploadFile = File(...)):
             lead_data = {
                 "name": row['name'].strip(),
                 "phone": row['phone'].strip(),
+                "phone_normalized": normalize_phone(row['phone'].strip()),
                 "email": row.get('email', '').strip(),
                 "company": row.get('company', '').strip(),
                 "notes": row.get('notes', '').strip(),
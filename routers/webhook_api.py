@@ -3,19 +3,43 @@ Webhook API Router
 Handles Piopiy call events and WebSocket streaming
 """
 
+import asyncio
+import atexit
+import concurrent.futures
+import logging
+import logging.handlers
 import os
-from fastapi import APIRouter, Request, HTTPException
+import queue
+import sys
+import threading
+import time
+from functools import lru_cache
+import orjson
+from fastapi import APIRouter, Request, HTTPException, Response
 from typing import Dict, Any, Optional
 import json
-from datetime import datetime
-from mongo_client import mongo_client
+from datetime import datetime, timedelta, timezone
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+from mongo_client import mongo_client, normalize_phone
 
 WS_URL = os.getenv("WEBSOCKET_URL")  # e.g. "ws://your_host:8765"
 
+# Handlers only enqueue records; the listener thread does the stdout writes, so
+# logging never blocks a request. Set WEBHOOK_LOG_LEVEL=DEBUG for full payloads.
+logger = logging.getLogger(__name__)
+logger.setLevel(os.getenv("WEBHOOK_LOG_LEVEL", "INFO").upper())
+logger.propagate = False
+_log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+logger.addHandler(logging.handlers.QueueHandler(_log_queue))
+_log_listener = logging.handlers.QueueListener(_log_queue, logging.StreamHandler(sys.stdout))
+_log_listener.start()
+atexit.register(_log_listener.stop)  # Write out queued records at exit, after shutdown hooks have logged
+
 try:
     from piopiy import Action
 except ImportError:
-    print("⚠️ Piopiy not installed - using mock Action")
+    logger.warning("⚠️ Piopiy not installed - using mock Action")
     class Action:
         def stream(self, ws_url, options):
             pass
@@ -27,281 +51,529 @@ router = APIRouter(
     tags=["Webhooks"]
 )
 
-# Global variable to track hangup state
-pending_hangup = False
-
-def log_call_event(event_type, data):
+# Constant webhook replies, serialized once at import instead of on every request
+ACK_ACCEPTED = orjson.dumps({"status": "accepted"})
+ACK_IGNORED = orjson.dumps({"status": "received", "note": "ignored event"})
+ACK_UNKNOWN_EVENT = orjson.dumps({"status": "received", "note": "unknown event"})
+HANGUP_ACTION = orjson.dumps({"hangup": True})
+HANGUP_INITIATED = orjson.dumps({
+    "success": True,
+    "message": "Call hangup initiated",
+    "action": {"hangup": True}
+})
+
+async def read_json(request: Request) -> dict:
+    """JSON body parsed with orjson; {} when it isn't JSON or doesn't parse"""
+    if request.headers.get("content-type") != "application/json":
+        return {}
+    body = await request.body()
+    if not body:
+        return {}
+    try:
+        data = orjson.loads(body)
+    except orjson.JSONDecodeError:
+        logger.warning("⚠️ Ignoring malformed JSON body on %s", request.url.path)
+        return {}
+    return data if isinstance(data, dict) else {}
+
+def json_bytes_response(body: bytes, status_code: int = 200) -> Response:
+    """Wrap pre-serialized JSON so FastAPI skips jsonable_encoder/json.dumps"""
+    return Response(content=body, status_code=status_code, media_type="application/json")
+
+# Pending hangups are per call and live in Mongo so every worker sees them.
+# A hangup requested without a call_id applies to the next inbound call.
+HANGUP_TTL_S = 30
+ANY_CALL = "*"
+_pending_hangups: Dict[str, float] = {}  # call_id -> expires_at, used when Mongo is down
+_pending_hangups_lock = threading.Lock()
+
+LEAD_CACHE_TTL_S = 60.0  # Phone -> lead lookups are reused this long across call events
+LEAD_CACHE_MAX = 10_000
+_lead_cache: Dict[str, tuple] = {}  # clean_phone -> (expires_at, lead doc)
+_lead_cache_lock = threading.Lock()
+
+WRITE_BATCH_MAX = 500    # Most lead updates sent to Mongo in one bulk_write
+WRITE_FLUSH_S = 0.1      # How long the flusher waits to fill a batch
+WRITE_QUEUE_MAX = 10_000
+# (UpdateOne, clean_phone whose cached lead it makes stale, or None)
+_write_queue: "queue.Queue[tuple[UpdateOne, Optional[str]]]" = queue.Queue(maxsize=WRITE_QUEUE_MAX)
+_flusher_thread: Optional[threading.Thread] = None
+_flusher_lock = threading.Lock()
+_flusher_stop = threading.Event()  # Set on shutdown; the flusher finishes its current batch and exits
+
+# Call events are processed here after the webhook has been acked
+EVENT_WORKERS = 8
+EVENT_CLAIM_STALE_S = 300  # A call event still "pending" this long was lost with its worker; a retry may reclaim it
+_event_executor = concurrent.futures.ThreadPoolExecutor(max_workers=EVENT_WORKERS, thread_name_prefix="webhook-event")
+
+def log_call_event(event_type, data, now=None):
     """Log call events for debugging"""
-    timestamp = datetime.now().isoformat()
+    timestamp = (now or datetime.now()).isoformat()
     safe_event = (str(event_type).upper()) if event_type else "UNKNOWN"
-    try:
-        print(f"\n📞 [{timestamp}] {safe_event}")
-        print(f"   Data: {json.dumps(data or {}, indent=2)}")
-    except Exception:
-        # Fallback if data isn't JSON serializable
-        print(f"\n📞 [{timestamp}] {safe_event}")
-        print(f"   Raw Data: {data}")
+    logger.info("📞 [%s] %s", timestamp, safe_event)
+    # Pretty-printing the payload is only paid for when debug logging is on
+    if logger.isEnabledFor(logging.DEBUG):
+        try:
+            logger.debug("   Data: %s", json.dumps(data or {}, indent=2))
+        except Exception:
+            # Fallback if data isn't JSON serializable
+            logger.debug("   Raw Data: %s", data)
 
 def clean_phone_number(phone_str):
     """Clean phone number for comparison"""
-    if not phone_str:
-        return ""
-    return str(phone_str).replace('+', '').replace('-', '').replace(' ', '')
+    return normalize_phone(phone_str)
+
+# Only what the event handlers read from a lead
+LEAD_FIELDS = {"_id": 1, "name": 1, "status": 1}
+# Lead status hierarchy, lowest first; updates never move a lead backwards
+STATUS_ORDER = ["new", "called", "contacted", "converted"]
+STATUS_RANK = {status: rank for rank, status in enumerate(STATUS_ORDER)}
+
+def lead_phone_query(clean_phone):
+    """
+    Indexed exact-match query on phone_normalized. Also tries the number with and
+    without the Indian country code, the mismatch the old substring regex absorbed.
+    """
+    variants = {clean_phone}
+    if len(clean_phone) >= 10:
+        variants.update((clean_phone[-10:], "91" + clean_phone[-10:]))
+    return {"phone_normalized": {"$in": list(variants)}}
+
+def get_lead_by_phone(clean_phone):
+    """Lead (_id/name/status) for a cleaned phone number, cached for LEAD_CACHE_TTL_S"""
+    now = time.monotonic()
+    with _lead_cache_lock:
+        cached = _lead_cache.get(clean_phone)
+        if cached and cached[0] > now:
+            return cached[1]
+    lead = mongo_client.leads.find_one(lead_phone_query(clean_phone), LEAD_FIELDS)
+    if lead:
+        with _lead_cache_lock:
+            if len(_lead_cache) >= LEAD_CACHE_MAX:
+                expired = [k for k, (exp, _) in _lead_cache.items() if exp <= now]
+                for phone in expired or list(_lead_cache):
+                    del _lead_cache[phone]
+            _lead_cache[clean_phone] = (now + LEAD_CACHE_TTL_S, lead)
+    return lead
+
+def invalidate_lead(clean_phone):
+    """Drop a cached lead after its status changes"""
+    with _lead_cache_lock:
+        _lead_cache.pop(clean_phone, None)
+
+def _write_lead_batch(items):
+    """Send queued lead updates to Mongo in one unordered round trip"""
+    try:
+        mongo_client.leads.bulk_write([op for op, _ in items], ordered=False)
+    except Exception as e:
+        logger.error("❌ Error writing %s lead updates: %s", len(items), e)
+    # Only now can a re-read see the new status; dropping earlier lets a lookup re-cache the old one
+    for _, clean_phone in items:
+        if clean_phone:
+            invalidate_lead(clean_phone)
+
+def _lead_write_flusher():
+    """Drain the write queue: up to WRITE_BATCH_MAX ops or WRITE_FLUSH_S, whichever comes first"""
+    while not _flusher_stop.is_set():
+        try:
+            ops = [_write_queue.get(timeout=WRITE_FLUSH_S)]
+        except queue.Empty:
+            continue
+        deadline = time.monotonic() + WRITE_FLUSH_S
+        while len(ops) < WRITE_BATCH_MAX:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                ops.append(_write_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        _write_lead_batch(ops)
+
+def queue_lead_write(op, clean_phone=None):
+    """
+    Hand a lead UpdateOne to the background flusher instead of writing it inline.
+    Pass clean_phone when the update changes cached lead fields; it is invalidated once written.
+    """
+    global _flusher_thread
+    if _flusher_thread is None:
+        with _flusher_lock:
+            if _flusher_thread is None:
+                _flusher_thread = threading.Thread(target=_lead_write_flusher, daemon=True, name="lead-write-flusher")
+                _flusher_thread.start()
+    try:
+        _write_queue.put_nowait((op, clean_phone))
+    except queue.Full:
+        # Flusher is behind; write this one directly rather than drop it
+        _write_lead_batch([(op, clean_phone)])
+
+def flush_lead_writes():
+    """Write whatever is still queued (used on shutdown)"""
+    ops = []
+    while True:
+        try:
+            ops.append(_write_queue.get_nowait())
+        except queue.Empty:
+            break
+    for i in range(0, len(ops), WRITE_BATCH_MAX):
+        _write_lead_batch(ops[i:i + WRITE_BATCH_MAX])
+
+def stop_lead_writes():
+    """Finish in-flight call events, stop the flusher after its current batch, then write the rest (blocking)"""
+    _event_executor.shutdown(wait=True)
+    _flusher_stop.set()
+    if _flusher_thread is not None:
+        _flusher_thread.join()
+    flush_lead_writes()
+
+@router.on_event("shutdown")
+async def flush_pending_lead_writes():
+    """Drain call events and lead writes off the event loop"""
+    await asyncio.get_running_loop().run_in_executor(None, stop_lead_writes)
+
+def request_hangup(call_id):
+    """Mark a call for hangup on its next inbound webhook, for HANGUP_TTL_S"""
+    key = str(call_id) if call_id else ANY_CALL
+    if mongo_client and mongo_client.is_connected():
+        try:
+            mongo_client.pending_hangups.update_one(
+                {"call_id": key},
+                {"$set": {"expires_at": datetime.now(timezone.utc) + timedelta(seconds=HANGUP_TTL_S)}},
+                upsert=True
+            )
+            return
+        except Exception as e:
+            logger.warning("⚠️ Could not store pending hangup in MongoDB: %s", e)
+    with _pending_hangups_lock:
+        _pending_hangups[key] = time.monotonic() + HANGUP_TTL_S
+
+def take_pending_hangup(call_id):
+    """Atomically consume a pending hangup for this call (or for any call); True if there was one"""
+    keys = [str(call_id), ANY_CALL] if call_id else [ANY_CALL]
+    if mongo_client and mongo_client.is_connected():
+        try:
+            # Mongo's TTL monitor only runs once a minute, so expiry is checked here too
+            return mongo_client.pending_hangups.find_one_and_delete(
+                {"call_id": {"$in": keys}, "expires_at": {"$gt": datetime.now(timezone.utc)}},
+                projection={"_id": 1}
+            ) is not None
+        except Exception as e:
+            logger.warning("⚠️ Could not check pending hangup in MongoDB: %s", e)
+    now = time.monotonic()
+    with _pending_hangups_lock:
+        for key in keys:
+            expires_at = _pending_hangups.pop(key, None)
+            if expires_at and expires_at > now:
+                return True
+    return False
+
+def call_event_key(call_id, event_type):
+    """Dedupe key for one provider event, or None when the payload can't be deduped"""
+    if not call_id or not event_type:
+        return None
+    return f"{call_id}:{str(event_type).lower()}"
+
+def is_duplicate_event(event_key):
+    """
+    Claim event_key as "pending"; True if the provider already delivered it (retry).
+    A claim left pending for EVENT_CLAIM_STALE_S is taken over by the retry.
+    """
+    if not event_key or not mongo_client or not mongo_client.is_connected():
+        return False
+    now = datetime.now(timezone.utc)  # TTL indexes expire on UTC time
+    try:
+        mongo_client.webhook_events.insert_one({"event_key": event_key, "state": "pending", "ts": now})
+        return False
+    except DuplicateKeyError:
+        reclaimed = mongo_client.webhook_events.find_one_and_update(
+            {"event_key": event_key, "state": "pending", "ts": {"$lt": now - timedelta(seconds=EVENT_CLAIM_STALE_S)}},
+            {"$set": {"ts": now}},
+            projection={"_id": 1}
+        )
+        return reclaimed is None
+    except Exception as e:
+        logger.warning("⚠️ Webhook dedupe check failed, processing anyway: %s", e)
+        return False
+
+def finish_event(event_key, processed):
+    """Mark a claimed event done, or release the claim after a failure so the provider's retry is applied"""
+    if not event_key or not mongo_client or not mongo_client.is_connected():
+        return
+    try:
+        if processed:
+            mongo_client.webhook_events.update_one({"event_key": event_key}, {"$set": {"state": "done"}})
+        else:
+            mongo_client.webhook_events.delete_one({"event_key": event_key, "state": "pending"})
+    except Exception as e:
+        logger.warning("⚠️ Could not record webhook event %s: %s", event_key, e)
 
-def update_lead_call_status(phone_number, status, call_data=None):
+def update_lead_call_status(phone_number, status, call_data=None, now=None):
     """Update lead status based on call events (smart status preservation)"""
     try:
         if not mongo_client or not mongo_client.is_connected():
-            print("❌ MongoDB not connected")
+            logger.error("❌ MongoDB not connected")
             return False
 
         # Clean phone number for comparison
         clean_phone = clean_phone_number(phone_number)
         if not clean_phone:
-            print(f"❌ Invalid phone number: {phone_number}")
+            logger.error("❌ Invalid phone number: %s", phone_number)
             return False
 
-        # Find lead by phone number (exact match or contains)
-        lead = mongo_client.leads.find_one({
-            "$or": [
-                {"phone": clean_phone},
-                {"phone": f"+{clean_phone}"},
-                {"phone": {"$regex": clean_phone, "$options": "i"}}
-            ]
-        })
+        new_level = STATUS_RANK.get(status)
+        if new_level is None:
+            logger.error("❌ Unknown lead status: %s", status)
+            return False
 
+        lead = get_lead_by_phone(clean_phone)
         if not lead:
-            print(f"❌ No lead found for phone: {phone_number} (cleaned: {clean_phone})")
+            logger.error("❌ No lead found for phone: %s (cleaned: %s)", phone_number, clean_phone)
             return False
 
-        print(f"✅ Found lead: {lead.get('name', 'Unknown')} for phone: {phone_number}")
-
-        current_status = lead.get("status", "new")
-
         # Smart status preservation - don't downgrade status
         # Status hierarchy: new < called < contacted < converted
-        status_hierarchy = {"new": 0, "called": 1, "contacted": 2, "converted": 3}
-
-        current_level = status_hierarchy.get(current_status, 0)
-        new_level = status_hierarchy.get(status, 0)
-
-        # Only update if the new status is higher in hierarchy, or if it's the same level
+        # The max() is evaluated by Mongo in the same atomic update, so concurrent
+        # events can't race each other into a downgrade, even though the write is batched.
+        now = now or datetime.now()  # Local time, like every other lead timestamp (not $$NOW/UTC)
+        queue_lead_write(UpdateOne(
+            {"_id": lead["_id"]},
+            [{"$set": {
+                "status": {"$arrayElemAt": [STATUS_ORDER, {"$max": [
+                    {"$indexOfArray": [STATUS_ORDER, "$status"]},
+                    new_level
+                ]}]},
+                "updated_at": now,
+                "last_call": now
+            }}]
+        ), clean_phone)
+
+        logger.info("✅ Found lead: %s for phone: %s", lead.get('name', 'Unknown'), phone_number)
+
+        # Status as last read (possibly cached); only used for the log lines below
+        current_status = lead.get("status", "new")
+        current_level = STATUS_RANK.get(current_status, -1)
         if new_level > current_level:
-            final_status = status
-            print(f"📈 Upgrading lead status: {current_status} -> {final_status}")
+            logger.info("📈 Upgrading lead status: %s -> %s", current_status, status)
         elif new_level == current_level:
-            final_status = status
-            print(f"📋 Maintaining lead status: {final_status}")
+            logger.info("📋 Maintaining lead status: %s", status)
         else:
-            # Don't downgrade - keep current higher status
-            final_status = current_status
-            print(f"🔒 Preserving higher status: {current_status} (not downgrading to {status})")
-
-        # Update lead status and timestamps only (do not increment attempts here)
-        update_doc = {
-            "$set": {
-                "status": final_status,
-                "updated_at": datetime.now(),
-                "last_call": datetime.now()
-            }
-        }
+            logger.info("🔒 Preserving higher status: %s (not downgrading to %s)", current_status, status)
 
-        result = mongo_client.leads.update_one(
-            {"_id": lead["_id"]},
-            update_doc
-        )
-
-        if result.modified_count > 0:
-            print(f"✅ Updated lead {lead.get('name', 'Unknown')} status to {final_status}")
-            return True
-        else:
-            print(f"⚠️ No changes made to lead {lead.get('name', 'Unknown')}")
-            return False
+        final_status = STATUS_ORDER[max(current_level, new_level)]
+        logger.info("✅ Queued lead %s status update to %s", lead.get('name', 'Unknown'), final_status)
+        return True
 
     except Exception as e:
-        print(f"❌ Error updating lead status: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("❌ Error updating lead status: %s", e)
         return False
 
+# Stream options shared by every inbound call; only extra_params vary
+STREAM_OPTIONS = {
+    "listen_mode": "both",
+    "stream_on_answer": True,
+    "voice_quality": 8000,
+}
+
+@lru_cache(maxsize=1024)
+def stream_pcmo(ws_url, phone_number=None, lead_id=None) -> bytes:
+    """Serialized PCMO streaming the call to ws_url; the same inputs always give the same PCMO"""
+    extra_params = {}
+    if phone_number:
+        extra_params["phone_number"] = phone_number
+    if lead_id:
+        extra_params["lead_id"] = lead_id
+
+    act = Action()
+    act.stream(ws_url=ws_url, options={**STREAM_OPTIONS, "extra_params": extra_params})
+    return orjson.dumps(act.PCMO())
+
 @router.post("/python/inbound")  # Updated route to match Flask exactly
 async def inbound_call(request: Request):
     """Handle inbound calls from Piopiy"""
-    global pending_hangup
+    req_json = await read_json(request)
+    call_id = req_json.get("call_id") or req_json.get("id") or req_json.get("uuid")
 
-    print(f"📞 Incoming call received")
-    print(f"   WS_URL: {WS_URL}")
-    print(f"   Pending hangup: {pending_hangup}")
+    logger.info("📞 Incoming call received")
+    logger.info("   WS_URL: %s", WS_URL)
+    logger.info("   Call ID: %s", call_id)
 
     # Check if hangup is pending
-    if pending_hangup:
-        pending_hangup = False  # Reset the flag
-        print("🛑 Hanging up call due to exit intent")
-        return {"hangup": True}
+    if await asyncio.get_running_loop().run_in_executor(None, take_pending_hangup, call_id):
+        logger.info("🛑 Hanging up call due to exit intent")
+        return json_bytes_response(HANGUP_ACTION)
 
     if not WS_URL:
-        print("❌ WEBSOCKET_URL is undefined")
+        logger.error("❌ WEBSOCKET_URL is undefined")
         raise HTTPException(status_code=500, detail="WEBSOCKET_URL undefined")
 
-    print(f"📞 Incoming call → {WS_URL}")
+    logger.info("📞 Incoming call → %s", WS_URL)
     try:
-        act = Action()
-
         # Forward context from request to WS via extra_params if present
-        req_json = await request.json() if request.headers.get("content-type") == "application/json" else {}
-        extra_params = {}
-        if req_json.get("phone_number"):
-            extra_params["phone_number"] = str(req_json["phone_number"])
-        if req_json.get("lead_id"):
-            extra_params["lead_id"] = str(req_json["lead_id"])
-
-        act.stream(
-            ws_url=WS_URL,
-            options={
-                "listen_mode": "both",
-                "stream_on_answer": True,
-                "voice_quality": 8000,
-                "extra_params": extra_params
-            }
-        )
-        pcmo = act.PCMO()
-        print(f"✅ PCMO generated: {pcmo}")
-        return pcmo
+        phone_number = str(req_json["phone_number"]) if req_json.get("phone_number") else None
+        lead_id = str(req_json["lead_id"]) if req_json.get("lead_id") else None
+
+        pcmo = stream_pcmo(WS_URL, phone_number, lead_id)
+        logger.info("✅ PCMO generated: %s", pcmo.decode())
+        return json_bytes_response(pcmo)
     except Exception as e:
-        print(f"❌ Error generating PCMO: {e}")
+        logger.error("❌ Error generating PCMO: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
+# Events that can change a lead; ring/initiated/dialing etc. are acked and dropped
+HANDLED_EVENTS = frozenset({"answer", "hangup", "no-answer", "busy", "missed"})
+
+def call_event_fields(data):
+    """(event_type, phone_number, call_id) from a provider payload"""
+    # Support multiple possible keys sent by provider
+    event_type = (
+            data.get("event")
+            or data.get("event_type")
+            or data.get("type")
+            or data.get("status")
+    )
+    phone_number = (
+            data.get("to")
+            or data.get("to_number")
+            or data.get("callee")
+            or data.get("from")
+            or data.get("from_number")
+            or data.get("caller")
+    )
+    call_id = data.get("call_id") or data.get("id") or data.get("uuid")
+    return event_type, phone_number, call_id
+
+def process_call_event(data, received_at=None):
+    """Dedupe, log and apply one call event to its lead (blocking PyMongo work)"""
+    event_type, phone_number, call_id = call_event_fields(data)
+    # One timestamp per event, so updated_at/last_call and the log line all agree.
+    # It is the time the webhook arrived, not when a worker got to it.
+    now = received_at or datetime.now()
+
+    event_key = call_event_key(call_id, event_type)
+    if is_duplicate_event(event_key):
+        logger.info("🔁 Duplicate %s event for call %s, skipping", event_type, call_id)
+        return
+
+    try:
+        apply_call_event(event_type, phone_number, data, now)
+    except Exception:
+        finish_event(event_key, processed=False)
+        raise
+    finish_event(event_key, processed=True)
+
+def apply_call_event(event_type, phone_number, data, now):
+    """Log one (already deduped) call event and apply it to its lead"""
+    log_call_event(event_type, data, now)
+
+    # Unknown events are only logged (the webhook already acked them with a 200)
+    if not event_type:
+        return
+
+    # Handle different call events
+    event = str(event_type).lower()
+    if event == "answer":
+        logger.info("📞 Call answered: %s", phone_number)
+
+        # Find the lead for this phone number
+        lead_id = None
+        if mongo_client and mongo_client.is_connected() and phone_number:
+            clean_phone = clean_phone_number(phone_number)
+            lead = get_lead_by_phone(clean_phone)
+            if lead:
+                lead_id = str(lead["_id"])
+                logger.info("📋 Found lead: %s (ID: %s)", lead.get('name', 'Unknown'), lead_id)
+
+        # Update lead status
+        if phone_number:
+            update_lead_call_status(phone_number, "contacted", data, now)
+
+    elif event == "hangup":
+        logger.info("📞 Call ended: %s", phone_number)
+
+        duration = data.get("duration", 0)
+        if phone_number:
+            if duration and duration > 10:
+                update_lead_call_status(phone_number, "contacted", data, now)
+            else:
+                update_lead_call_status(phone_number, "called", data, now)
+
+        if mongo_client and mongo_client.is_connected():
+            try:
+                lead = None
+                if phone_number:
+                    clean_phone = clean_phone_number(phone_number)
+                    lead = get_lead_by_phone(clean_phone)
+
+                # Only update last_call here; do not increment attempts
+                if lead:
+                    queue_lead_write(UpdateOne(
+                        {"_id": lead["_id"]},
+                        {"$set": {"last_call": now}}
+                    ))
+                    logger.info("✅ Queued lead call timestamp update")
+            except Exception as e:
+                logger.error("❌ Error logging call to database: %s", e)
+
+    elif event in ("no-answer", "busy", "missed"):
+        logger.info("📞 Call not answered: %s (%s)", phone_number, event_type)
+        if phone_number:
+            update_lead_call_status(phone_number, "called", data, now)
+
+def _log_event_failure(future):
+    """Surface errors from call events processed after the ack"""
+    e = future.exception()
+    if e:
+        logger.error("❌ Error handling call event: %s", e, exc_info=e)
+
 @router.post("/piopiy/events")  # Updated route to match Flask exactly
 async def handle_call_events(request: Request):
     """Handle Piopiy call events (answer, hangup, etc.)"""
     try:
-        data = await request.json() if request.headers.get("content-type") == "application/json" else {}
-        # Support multiple possible keys sent by provider
-        event_type = (
-                data.get("event")
-                or data.get("event_type")
-                or data.get("type")
-                or data.get("status")
-        )
-        phone_number = (
-                data.get("to")
-                or data.get("to_number")
-                or data.get("callee")
-                or data.get("from")
-                or data.get("from_number")
-                or data.get("caller")
-        )
-        call_id = data.get("call_id") or data.get("id") or data.get("uuid")
-
-        log_call_event(event_type, data)
-
-        # If we still don't know the event, acknowledge and return 200 to avoid retries
+        data = await read_json(request)
+        event_type, _, _ = call_event_fields(data)
+        if event_type and str(event_type).lower() not in HANDLED_EVENTS:
+            # Nothing to apply: skip dedupe, logging and every Mongo round trip
+            logger.debug("Ignoring %s event", event_type)
+            return json_bytes_response(ACK_IGNORED)
+
+        # Ack right away; the Mongo work runs on the event workers so its latency
+        # never delays the ack (a slow ack is what makes the provider retry)
+        _event_executor.submit(process_call_event, data, datetime.now()).add_done_callback(_log_event_failure)
         if not event_type:
-            return {"status": "received", "note": "unknown event"}
-
-        # Handle different call events
-        if str(event_type).lower() == "answer":
-            print(f"📞 Call answered: {phone_number}")
-
-            # Find the lead for this phone number
-            lead_id = None
-            if mongo_client and mongo_client.is_connected() and phone_number:
-                clean_phone = clean_phone_number(phone_number)
-                lead = mongo_client.leads.find_one({
-                    "$or": [
-                        {"phone": clean_phone},
-                        {"phone": f"+{clean_phone}"},
-                        {"phone": {"$regex": clean_phone, "$options": "i"}}
-                    ]
-                })
-                if lead:
-                    lead_id = str(lead["_id"])
-                    print(f"📋 Found lead: {lead.get('name', 'Unknown')} (ID: {lead_id})")
-
-            # Update lead status
-            if phone_number:
-                update_lead_call_status(phone_number, "contacted", data)
-
-        elif str(event_type).lower() == "hangup":
-            print(f"📞 Call ended: {phone_number}")
-
-            duration = data.get("duration", 0)
-            if phone_number:
-                if duration and duration > 10:
-                    update_lead_call_status(phone_number, "contacted", data)
-                else:
-                    update_lead_call_status(phone_number, "called", data)
-
-            if mongo_client and mongo_client.is_connected():
-                try:
-                    lead = None
-                    if phone_number:
-                        clean_phone = clean_phone_number(phone_number)
-                        lead = mongo_client.leads.find_one({
-                            "$or": [
-                                {"phone": clean_phone},
-                                {"phone": f"+{clean_phone}"},
-                                {"phone": {"$regex": clean_phone, "$options": "i"}}
-                            ]
-                        })
-
-                    # Only update last_call here; do not increment attempts
-                    if lead:
-                        mongo_client.leads.update_one(
-                            {"_id": lead["_id"]},
-                            {"$set": {"last_call": datetime.now()}}
-                        )
-                        print(f"✅ Updated lead call timestamp")
-                except Exception as e:
-                    print(f"❌ Error logging call to database: {e}")
-
-        elif str(event_type).lower() in ("no-answer", "busy", "missed"):
-            print(f"📞 Call not answered: {phone_number} ({event_type})")
-            if phone_number:
-                update_lead_call_status(phone_number, "called", data)
-
-        return {"status": "received"}
+            # Logged only; nothing to apply, so a plain 200
+            return json_bytes_response(ACK_UNKNOWN_EVENT)
+        return json_bytes_response(ACK_ACCEPTED, status_code=202)
 
     except Exception as e:
-        print(f"❌ Error handling call event: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("❌ Error handling call event: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/hangup-call")
 async def hangup_call(request: Request):
     """Handle call hangup requests from WebSocket server"""
-    global pending_hangup
-
     try:
-        data = await request.json() if request.headers.get("content-type") == "application/json" else {}
+        data = await read_json(request)
         reason = data.get("reason", "user_request")
         call_id = data.get("call_id")
 
+        now = datetime.now()
         log_call_event("hangup_request", {
             "reason": reason,
             "call_id": call_id,
-            "timestamp": datetime.now().isoformat()
-        })
+            "timestamp": now.isoformat()
+        }, now)
 
-        # Return hangup action to Piopiy
-        # This will be sent as the next action in the call flow
-        hangup_response = {"hangup": True}
+        # Store hangup signal for this call's next Piopiy webhook (shared across workers)
+        await asyncio.get_running_loop().run_in_executor(None, request_hangup, call_id)
 
-        # Store hangup signal for any active Piopiy connections
-        # In a production system, you'd store this in Redis or similar
-        pending_hangup = True
+        logger.info("🛑 Call hangup requested - Reason: %s", reason)
 
-        print(f"🛑 Call hangup requested - Reason: {reason}")
-
-        return {
-            "success": True,
-            "message": "Call hangup initiated",
-            "action": hangup_response
-        }
+        # Return hangup action to Piopiy
+        # This will be sent as the next action in the call flow
+        return json_bytes_response(HANGUP_INITIATED)
 
     except Exception as e:
-        print(f"Error in hangup_call: {e}")
+        logger.error("Error in hangup_call: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/start-call")
@@ -311,10 +583,10 @@ async def start_call_session(request: Request):
         if not WS_URL:
             raise HTTPException(status_code=500, detail="WEBSOCKET_URL undefined")
 
-        print(f"📞 Starting call session → {WS_URL}")
+        logger.info("📞 Starting call session → %s", WS_URL)
 
         # You can extend this to accept phone numbers from frontend
-        data = await request.json() if request.headers.get("content-type") == "application/json" else {}
+        data = await read_json(request)
         phone_number = data.get("phone_number")
 
         if phone_number:
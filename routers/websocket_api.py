@@ -6,29 +6,35 @@ Handles real-time voice bot functionality with Deepgram, Google TTS, and AI proc
 from fastapi import APIRouter, WebSocket
 import asyncio
 import base64
-import json
+import hashlib
+import html
+import logging
 import os
-import threading
 import time
-from queue import SimpleQueue
 from datetime import datetime, timedelta
 from typing import Optional
+from dataclasses import dataclass, field
+from contextvars import ContextVar, Token
+from collections import OrderedDict, deque
 import re
 import httpx
-from websocket import ABNF, WebSocketApp
-from urllib.parse import parse_qs, urlparse
-from piopiy import StreamAction
+import orjson
+from websockets.asyncio.client import connect as ws_connect
 import numpy as np
 import scipy.signal as sps
 import scipy.io.wavfile
 
 # Import project dependencies
 from mongo_client import mongo_client
+from agent_config import agent_config
 from routers.calls_api import log_call, update_lead_status_from_call
 from qa_engine import RealEstateQA
 from ai_services import AIServices
 
 router = APIRouter(tags=["WebSocket"])
+# Hot-path diagnostics (per audio frame / per ASR message); silent unless DEBUG is configured
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
 
 # ---------------------------
 # Environment variables
@@ -52,6 +58,9 @@ END_AFTER_IDLE_S = int(os.getenv("END_AFTER_IDLE_S", "60"))            # End cal
 # Audio buffer size for Deepgram
 AUDIO_BUFFER_SIZE = 8000  # ~500ms at 8kHz 16-bit mono
 
+# Write caller audio samples to WAV files for debugging
+SAVE_AUDIO_SAMPLES = os.getenv("SAVE_AUDIO_SAMPLES", "false").lower() == "true"
+
 # ---------------------------
 # Constants
 # ---------------------------
@@ -61,38 +70,171 @@ DG_WS_URL = (
     "sample_rate=8000&encoding=linear16&model=nova-2"
     "&language=en-IN&smart_format=true&vad_turnoff=1000&no_delay=true"
 )
+_SENT_SPLIT = re.compile(r'(?<=[.!?])\s+')
+# Google TTS request body minus the per-utterance input
+_TTS_TEMPLATE = {
+    "voice": {"languageCode": "en-IN", "name": GOOGLE_TTS_VOICE},
+    "audioConfig": {
+        "audioEncoding": "LINEAR16",
+        "sampleRateHertz": 8000,
+        "speakingRate": GOOGLE_TTS_RATE,
+        "pitch": GOOGLE_TTS_PITCH,
+        "effectsProfileId": ["telephony-class-application"]
+    }
+}
+_JSON_HEADERS = {"Content-Type": "application/json"}
+# SSML wrapper depends only on startup config, so it is formatted once
+_SSML_PREFIX = f"<speak><prosody rate='slow' pitch='{GOOGLE_TTS_PITCH:+.1f}st'>"
+_SSML_SUFFIX = "</prosody></speak>"
+# Deepgram frames that can carry a final transcript; interim Results skip parsing
+_DG_RESULTS_RE = re.compile(r'"type"\s*:\s*"Results"')
+_DG_FINAL_RE = re.compile(r'"(?:is_final|speech_final|final)"\s*:\s*true')
+_UUID_RE = re.compile(r'[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}')
+RECENT_CALL_WINDOW = timedelta(minutes=5)  # How far back an "initiated" call still counts
+DG_SEND_QUEUE_CHUNKS = 4  # ~2s of audio may queue behind a stalled Deepgram socket before chunks are dropped
+DG_KEEPALIVE_IDLE_S = 5.0  # Send Deepgram a KeepAlive only after this long without audio
+DG_FLUSH_TIMEOUT_S = 1.0  # On hangup, wait this long for queued audio to reach Deepgram before closing
+RESPONSE_CACHE_SIZE = 256  # LLM replies remembered per (user text, recent history, agent config)
+RESPONSE_CACHE_TTL_S = 600.0  # A cached reply is regenerated after this long even if nothing changed
+AUDIO_STATS_INTERVAL_S = 1.0  # Aggregate caller-audio byte counts into one log line per interval
+PHRASE_WATCH_S = 2.0  # How often the phrase cache checks agent_config for a new greeting/exit
+RECENT_CALL_CACHE_TTL_S = 60.0  # Session-id -> initiated call lookups are reused this long
+_RECENT_CALL_FIELDS = {"phone_number": 1, "lead_id": 1, "_id": 0}
+# Fixed bot phrases; their TTS audio is synthesized once and reused across calls
+NUDGE_PROMPT = "Are you still there? How can I assist you with real estate today?"
+LLM_TIMEOUT_REPLY = "I'm sorry, I'm taking a bit longer. Could you please repeat or clarify what you'd like help with?"
+LLM_AUTH_ERROR_REPLY = "I'm sorry, there's an authentication issue with my AI service. Please check the API configuration."
+LLM_CONNECTION_ERROR_REPLY = "I'm sorry, I'm having trouble connecting to my AI service. Please try again."
+LLM_ERROR_REPLY = "I'm sorry, I encountered an error. Please try again."
+# 100 Hz high-pass for caller audio; designed once instead of per chunk
+_HIGHPASS_B, _HIGHPASS_A = sps.butter(4, 100.0 / (8000 / 2), btype='high', analog=False)
+
+# ---------------------------
+# Audio ring buffer
+# ---------------------------
+class AudioRing:
+    """
+    Fixed-capacity (power-of-two) ring buffer for caller audio.
+    Appending and popping copy only the bytes involved instead of
+    shifting the whole backlog like bytearray slice + del does.
+    """
+    __slots__ = ("buf", "_mask", "head", "tail", "size")
+
+    def __init__(self, min_capacity: int):
+        capacity = 1 << max(0, min_capacity - 1).bit_length()
+        self.buf = bytearray(capacity)
+        self._mask = capacity - 1
+        self.head = 0  # read index
+        self.tail = 0  # write index
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def extend(self, mv: memoryview) -> None:
+        """Append audio; if the ring is full the oldest bytes are overwritten."""
+        capacity = self._mask + 1
+        n = len(mv)
+        if n > capacity:
+            mv = mv[n - capacity:]
+            n = capacity
+        overflow = self.size + n - capacity
+        if overflow > 0:
+            self.head = (self.head + overflow) & self._mask
+            self.size -= overflow
+        tail = self.tail
+        n1 = min(n, capacity - tail)
+        self.buf[tail:tail + n1] = mv[:n1]
+        if n1 < n:
+            self.buf[:n - n1] = mv[n1:]
+        self.tail = (tail + n) & self._mask
+        self.size += n
+
+    def pop_chunk(self, n: int) -> bytes:
+        """Remove and return up to n bytes from the front of the ring."""
+        n = min(n, self.size)
+        head = self.head
+        n1 = min(n, self._mask + 1 - head)
+        with memoryview(self.buf) as view:
+            if n1 == n:
+                chunk = bytes(view[head:head + n])
+            else:
+                chunk = b"".join((view[head:head + n1], view[:n - n1]))
+        self.head = (head + n) & self._mask
+        self.size -= n
+        return chunk
+
+    def pop_view(self, n: int) -> memoryview:
+        """
+        Remove up to n bytes and return them as a view into the ring itself.
+        Zero-copy unless the chunk wraps around; only valid until the next extend().
+        """
+        n = min(n, self.size)
+        head = self.head
+        if head + n > self._mask + 1:
+            return memoryview(self.pop_chunk(n))
+        self.head = (head + n) & self._mask
+        self.size -= n
+        return memoryview(self.buf)[head:head + n]
+
+    def reset(self) -> None:
+        """Drop buffered audio in O(1); the backing store is kept for reuse."""
+        self.head = self.tail = self.size = 0
 
 # ---------------------------
 # Globals
 # ---------------------------
-transcript_q = SimpleQueue()  # Final utterances from ASR
-tts_q = SimpleQueue()         # Bot texts awaiting TTS
 ai_services = AIServices()
-dg_ws_client = None
-piopiy_ws = None
-audio_buffer = bytearray()    # Incoming caller audio
-transcription_buffer = []     # Buffered transcriptions for processing
-
-# Bot speaking window: ignore caller audio during this time (no barge-in)
-bot_speaking_until: Optional[datetime] = None
-
-# Global call tracking
-current_call_data = {
-    "phone_number": None,
-    "lead_id": None,
-    "transcription": [],
-    "ai_responses": [],
-    "start_time": None,
-    "end_time": None,
-    "call_session_id": None
-}
+qa_bot = RealEstateQA(ai_services)  # Stateless; shared by every call and the finalizer
+_recent_call_cache: dict[str, tuple[float, dict]] = {}  # session_id -> (expires_at, call doc)
+_response_cache: OrderedDict[str, tuple[float, str]] = OrderedDict()  # LRU of (expires_at, LLM reply)
+_phrase_audio_cache: dict[str, Optional[tuple[str, int]]] = {}  # Fixed phrase -> (audio_b64, raw_len), None until synthesized
+_config_phrases: tuple[str, ...] = ()  # Greeting and exit texts the phrase cache was last warmed for
+_phrase_warm_task: Optional[asyncio.Task] = None
+_finalization_q = asyncio.Queue()  # Finished CallData awaiting analysis + MongoDB writes
+_finalizer_task: Optional[asyncio.Task] = None
+FINALIZE_DRAIN_TIMEOUT_S = 30.0  # Shutdown waits this long for queued calls to be saved
+
+# Shared Google TTS client: one TLS handshake per process, HTTP/2 multiplexed requests
+_tts_client = httpx.AsyncClient(
+    http2=True,
+    timeout=httpx.Timeout(20.0, connect=3.0),
+    limits=httpx.Limits(max_keepalive_connections=8, max_connections=16),
+)
+
+# Per-connection call state
+@dataclass(slots=True)
+class CallData:
+    """Tracking data, audio buffers, queues and sockets owned by one Piopiy connection (see current_call)."""
+    phone_number: Optional[str] = None
+    lead_id: Optional[str] = None
+    transcription: list = field(default_factory=list)  # (type, content, epoch) tuples until finalized
+    ai_responses: list = field(default_factory=list)
+    start_time: Optional[datetime] = None
+    end_time: Optional[datetime] = None
+    call_session_id: Optional[str] = None
+    piopiy_ws: Optional[WebSocket] = None
+    audio_ring: AudioRing = field(default_factory=lambda: AudioRing(8 * AUDIO_BUFFER_SIZE))  # Incoming caller audio
+    # Rotating filtered-chunk buffers for Deepgram sends: one per queued chunk, plus the one
+    # in flight and the one being filled, so a slot is never overwritten before it is sent
+    dg_out_samples: np.ndarray = field(
+        default_factory=lambda: np.empty((DG_SEND_QUEUE_CHUNKS + 2, AUDIO_BUFFER_SIZE // 2), dtype=np.int16))
+    # Bot speaking window (time.monotonic() deadline): ignore caller audio until then (no barge-in)
+    bot_speaking_until_mono: float = 0.0
+    transcript_q: asyncio.Queue = field(default_factory=asyncio.Queue)  # Final utterances from ASR
+    tts_q: asyncio.Queue = field(default_factory=asyncio.Queue)  # Bot texts awaiting TTS
+    dg_ws: object = None  # This call's Deepgram connection (websockets), None while disconnected
+    dg_task: Optional[asyncio.Task] = None  # Deepgram connect/read/reconnect task
+    dg_connected: asyncio.Event = field(default_factory=asyncio.Event)
+    dg_last_send: float = 0.0  # time.monotonic() of the last frame sent to Deepgram
+    dg_send_q: asyncio.Queue = field(default_factory=lambda: asyncio.Queue(maxsize=DG_SEND_QUEUE_CHUNKS))  # Audio awaiting the sender task
+
+# Set by start_call_tracking in the endpoint; its worker tasks inherit the same CallData
+current_call: ContextVar[CallData] = ContextVar("current_call")
 
 # ===========================
 # Utilities
 # ===========================
-def _escape_ssml(text: str) -> str:
-    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;").replace('"', "&quot;").replace("'", "&apos;")
-
 def text_to_ssml(text: str) -> str:
     """
     Convert raw text into SSML with natural sentence breaks
@@ -102,131 +244,195 @@ def text_to_ssml(text: str) -> str:
     if not text:
         return "<speak></speak>"
 
-    parts = re.split(r'(?<=[.!?])\s+', text)
-    segments = []
-    for i, p in enumerate(parts):
-        if not p:
-            continue
-        p_esc = _escape_ssml(p)
-        pause = "350ms" if i == 0 else "300ms"
-        segments.append(f"<s>{p_esc}</s><break time='{pause}'/>")
-
-    body = " ".join(segments)
-    return (
-        "<speak>"
-        f"<prosody rate='slow' pitch='{GOOGLE_TTS_PITCH:+.1f}st'>{body}</prosody>"
-        "</speak>"
-    )
+    segments = [
+        "<s>" + html.escape(p, quote=False) + ("</s><break time='350ms'/>" if i == 0 else "</s><break time='300ms'/>")
+        for i, p in enumerate(_SENT_SPLIT.split(text)) if p
+    ]
+    return "".join((_SSML_PREFIX, " ".join(segments), _SSML_SUFFIX))
 
-def now() -> datetime:
-    return datetime.now()
+def response_cache_key(user_text: str, history: list) -> str:
+    """Key an LLM reply by the normalized user text, the last two turns of history and the
+    agent_config file signature, so an edited prompt or knowledge base misses the old replies"""
+    history_hash = hashlib.blake2b(orjson.dumps(history[-4:]), digest_size=16).hexdigest()
+    config_signature = agent_config.file_signature()
+    return hashlib.blake2b(f"{user_text.lower().strip()}|{history_hash}|{config_signature}".encode(), digest_size=16).hexdigest()
 
 def set_bot_speaking_for_seconds(seconds: float):
-    """Mark bot as speaking for a computed duration (+ small pad)."""
-    global bot_speaking_until
+    """Mark bot as speaking for a computed duration (+ small pad).
+    Back-to-back sentences queue behind the audio already playing."""
+    call = current_call.get()
     pad = BOT_SPEAKING_PAD_MS / 1000.0
-    bot_speaking_until = now() + timedelta(seconds=max(0.0, seconds) + pad)
+    start = max(time.monotonic(), call.bot_speaking_until_mono - pad)
+    call.bot_speaking_until_mono = start + max(0.0, seconds) + pad
     print(f"⏳ Bot speaking window set for {seconds + pad:.2f}s")
 
 def bot_is_speaking() -> bool:
-    return bool(bot_speaking_until and now() < bot_speaking_until)
+    return time.monotonic() < current_call.get().bot_speaking_until_mono
 
-def fast_audio_convert(raw_audio: bytes) -> bytes:
-    """Convert audio to Deepgram-compatible format with noise filtering"""
+def fast_audio_convert(raw_audio, out: Optional[np.ndarray] = None):
+    """Convert audio to Deepgram-compatible format with noise filtering.
+    Accepts any buffer (bytes/memoryview); cheap enough to run inline on the loop.
+    With `out` (int16 scratch array) the result is written there and returned as a
+    byte memoryview into it, valid until the next call; otherwise returns bytes."""
     try:
         samples = np.frombuffer(raw_audio, dtype=np.int16)
-        b, a = sps.butter(4, 100.0 / (8000 / 2), btype='high', analog=False)
-        filtered = sps.filtfilt(b, a, samples)
-        normalized = np.clip(filtered * 0.8, -32767, 32767).astype(np.int16)
-        scipy.io.wavfile.write(f"input_audio_sample_{int(time.time())}.wav", 8000, normalized)
-        print(f"🎵 Saved audio sample to input_audio_sample_{int(time.time())}.wav")
+        filtered = sps.filtfilt(_HIGHPASS_B, _HIGHPASS_A, samples)
+        filtered *= 0.8
+        np.clip(filtered, -32767, 32767, out=filtered)
+        if out is not None and len(out) >= len(filtered):
+            normalized = out[:len(filtered)]
+            np.copyto(normalized, filtered, casting="unsafe")
+        else:
+            normalized = filtered.astype(np.int16)
+        if SAVE_AUDIO_SAMPLES:
+            scipy.io.wavfile.write(f"input_audio_sample_{int(time.time())}.wav", 8000, normalized)
+            print(f"🎵 Saved audio sample to input_audio_sample_{int(time.time())}.wav")
+        if out is not None:
+            return memoryview(normalized).cast("B")
         return normalized.tobytes()
     except Exception as e:
         print(f"⚠️ Audio conversion error: {e}")
-        return raw_audio
+        return bytes(raw_audio)
 
 # ===========================
 # Logging & Call Tracking
 # ===========================
-async def log_call_message(message_type: str, content: str, phone_number: Optional[str] = None, lead_id: Optional[str] = None):
-    """Log call message and track conversation"""
+def log_call_message(message_type: str, content: str, phone_number: Optional[str] = None, lead_id: Optional[str] = None):
+    """Log call message and track conversation (in memory only; saved to MongoDB once at call end)"""
     try:
-        timestamp = datetime.now().strftime("%H:%M:%S")
+        call = current_call.get()
+        logged_at = time.time()
+        timestamp = time.strftime("%H:%M:%S", time.localtime(logged_at))
+        # Entries are cheap (type, content, epoch) tuples; finalize_call turns them into documents
         if message_type == "user":
             print(f"🎤 [{timestamp}] User: {content}")
-            current_call_data["transcription"].append({
-                "type": "user",
-                "content": content,
-                "timestamp": datetime.now().isoformat()
-            })
+            call.transcription.append(("user", content, logged_at))
         elif message_type == "bot":
             print(f"🤖 [{timestamp}] Bot: {content}")
-            current_call_data["ai_responses"].append({
-                "type": "bot",
-                "content": content,
-                "timestamp": datetime.now().isoformat()
-            })
+            call.ai_responses.append(("bot", content, logged_at))
         elif message_type == "greeting":
             print(f"👋 [{timestamp}] Greeting: {content}")
-            current_call_data["ai_responses"].append({
-                "type": "greeting",
-                "content": content,
-                "timestamp": datetime.now().isoformat()
-            })
+            call.ai_responses.append(("greeting", content, logged_at))
         elif message_type == "exit":
             print(f"👋 [{timestamp}] Exit: {content}")
-            current_call_data["ai_responses"].append({
-                "type": "exit",
-                "content": content,
-                "timestamp": datetime.now().isoformat()
-            })
+            call.ai_responses.append(("exit", content, logged_at))
         elif message_type == "system":
             print(f"⚙️ [{timestamp}] System: {content}")
 
         if phone_number:
-            current_call_data["phone_number"] = phone_number
+            call.phone_number = phone_number
         if lead_id:
-            current_call_data["lead_id"] = lead_id
+            call.lead_id = lead_id
     except Exception as e:
         print(f"⚠️ Call logging error: {e}")
 
-async def start_call_tracking(phone_number: str, lead_id: Optional[str] = None, call_session_id: Optional[str] = None):
-    """Start tracking a new call"""
-    global current_call_data
-    current_call_data = {
-        "phone_number": phone_number,
-        "lead_id": lead_id,
-        "transcription": [],
-        "ai_responses": [],
-        "start_time": datetime.now(),
-        "end_time": None,
-        "call_session_id": call_session_id
-    }
+async def get_recent_call(session_id: str) -> Optional[dict]:
+    """Find the recently initiated call for a session id without blocking the loop (cached).
+
+    Served by the (call_session_id, status, created_at) index; only phone_number
+    and lead_id are fetched since that is all the callers read.
+    """
+    cached = _recent_call_cache.get(session_id)
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+    if not (mongo_client and mongo_client.is_connected()):
+        return None
+
+    def _find():
+        return mongo_client.calls.find_one({
+            "call_session_id": session_id,
+            "status": "initiated",
+            "created_at": {"$gte": datetime.now() - RECENT_CALL_WINDOW}
+        }, projection=_RECENT_CALL_FIELDS, sort=[("created_at", -1)])
+
+    recent_call = await asyncio.get_running_loop().run_in_executor(None, _find)
+    if recent_call:
+        now_mono = time.monotonic()
+        if len(_recent_call_cache) > 256:
+            for sid in [k for k, (exp, _) in _recent_call_cache.items() if exp <= now_mono]:
+                del _recent_call_cache[sid]
+        _recent_call_cache[session_id] = (now_mono + RECENT_CALL_CACHE_TTL_S, recent_call)
+    return recent_call
+
+async def start_call_tracking(phone_number: str, lead_id: Optional[str] = None, call_session_id: Optional[str] = None,
+                              piopiy_ws: Optional[WebSocket] = None) -> Token:
+    """Start tracking a new call; the returned token resets current_call once the connection is done"""
+    token = current_call.set(CallData(
+        phone_number=phone_number,
+        lead_id=lead_id,
+        start_time=datetime.now(),
+        call_session_id=call_session_id,
+        piopiy_ws=piopiy_ws
+    ))
     print(f"📞 Started tracking call for {phone_number}")
+    return token
 
 async def end_call_tracking():
-    """End call tracking and save to MongoDB"""
-    global current_call_data
-    if not current_call_data["phone_number"] and not current_call_data["transcription"] and not current_call_data["ai_responses"]:
+    """End call tracking and hand the call to the background finalizer for saving"""
+    call = current_call.get()
+    if not call.phone_number and not call.transcription and not call.ai_responses:
         print("📞 No meaningful call data to save")
         return
 
-    if current_call_data["phone_number"] == "unknown" and not current_call_data["transcription"] and not current_call_data["ai_responses"]:
+    if call.phone_number == "unknown" and not call.transcription and not call.ai_responses:
         print("📞 Skipping log for unknown phone with no conversation")
         return
 
+    call.end_time = datetime.now()
+    _finalization_q.put_nowait(call)
+
+async def call_finalizer_worker():
+    """Save finished calls one at a time, off the WebSocket teardown path"""
+    while True:
+        call = await _finalization_q.get()
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, finalize_call, call)
+        except Exception as e:
+            print(f"❌ Error finalizing call: {e}")
+        finally:
+            _finalization_q.task_done()
+
+@router.on_event("startup")
+async def start_call_finalizer():
+    """Start the worker that saves finished calls"""
+    global _finalizer_task
+    if _finalizer_task is None:
+        _finalizer_task = asyncio.create_task(call_finalizer_worker())
+
+@router.on_event("shutdown")
+async def drain_call_finalizer():
+    """Save calls that already ended (bounded wait), then stop the finalizer worker"""
+    global _finalizer_task
+    if _finalizer_task is None:
+        return
     try:
-        current_call_data["end_time"] = datetime.now()
-        duration = (current_call_data["end_time"] - current_call_data["start_time"]).total_seconds() if current_call_data["start_time"] and current_call_data["end_time"] else 0
-        phone_to_log = current_call_data["phone_number"] or "unknown"
+        await asyncio.wait_for(_finalization_q.join(), timeout=FINALIZE_DRAIN_TIMEOUT_S)
+    except asyncio.TimeoutError:
+        print(f"⚠️ {_finalization_q.qsize()} finished call(s) not saved before shutdown")
+    _finalizer_task.cancel()
+    _finalizer_task = None
+
+def _entries_to_docs(entries: list) -> list[dict]:
+    """Expand (type, content, epoch) log tuples into the stored message documents"""
+    return [
+        {"type": kind, "content": content, "timestamp": datetime.fromtimestamp(ts).isoformat()}
+        for kind, content, ts in entries
+    ]
+
+def finalize_call(call: CallData):
+    """Run interest analysis and save a finished call to MongoDB (blocking)"""
+    try:
+        call.transcription = _entries_to_docs(call.transcription)
+        call.ai_responses = _entries_to_docs(call.ai_responses)
+        duration = (call.end_time - call.start_time).total_seconds() if call.start_time and call.end_time else 0
+        phone_to_log = call.phone_number or "unknown"
 
         interest_analysis = None
-        if current_call_data["transcription"] and current_call_data["ai_responses"]:
+        if call.transcription and call.ai_responses:
             try:
-                bot = RealEstateQA(ai_services)
-                interest_analysis = bot.analyze_conversation_interest(
-                    current_call_data["transcription"],
-                    current_call_data["ai_responses"]
+                interest_analysis = qa_bot.analyze_conversation_interest(
+                    call.transcription,
+                    call.ai_responses
                 )
                 print(f"✅ Interest analysis: {interest_analysis['interest_status']} ({interest_analysis['confidence']:.2f})")
             except Exception as e:
@@ -240,33 +446,33 @@ async def end_call_tracking():
 
         call_data = {
             "duration": duration,
-            "transcription": current_call_data["transcription"],
-            "ai_responses": current_call_data["ai_responses"],
-            "summary": f"Call with {len(current_call_data['transcription'])} user messages and {len(current_call_data['ai_responses'])} AI responses",
+            "transcription": call.transcription,
+            "ai_responses": call.ai_responses,
+            "summary": f"Call with {len(call.transcription)} user messages and {len(call.ai_responses)} AI responses",
             "sentiment": "neutral",
             "interest_analysis": interest_analysis,
-            "call_session_id": current_call_data.get("call_session_id"),
+            "call_session_id": call.call_session_id,
             "status": "completed"
         }
 
-        if current_call_data["transcription"] or current_call_data["ai_responses"]:
-            if current_call_data.get("call_session_id"):
-                result = log_call(phone_to_log, current_call_data["lead_id"], call_data)
+        if call.transcription or call.ai_responses:
+            if call.call_session_id:
+                result = log_call(phone_to_log, call.lead_id, call_data)
                 if result["success"]:
-                    print(f"✅ Call logged to MongoDB: {phone_to_log} (session: {current_call_data.get('call_session_id')})")
-                    update_lead_status_from_call(phone_to_log, current_call_data["lead_id"], call_data)
+                    print(f"✅ Call logged to MongoDB: {phone_to_log} (session: {call.call_session_id})")
+                    update_lead_status_from_call(phone_to_log, call.lead_id, call_data)
                 else:
                     print(f"⚠️ Failed to log call: {result.get('error', 'Unknown error')}")
             elif phone_to_log != "unknown" and mongo_client and mongo_client.is_connected():
                 try:
-                    five_minutes_ago = datetime.now() - timedelta(minutes=5)
+                    five_minutes_ago = datetime.now() - RECENT_CALL_WINDOW
                     query = {"status": "initiated", "created_at": {"$gte": five_minutes_ago}}
-                    if current_call_data["lead_id"]:
-                        query["lead_id"] = current_call_data["lead_id"]
+                    if call.lead_id:
+                        query["lead_id"] = call.lead_id
                     else:
                         query["phone_number"] = phone_to_log
 
-                    recent_call = mongo_client.calls.find_one(query, sort=[("created_at", -1)])
+                    recent_call = mongo_client.calls.find_one(query, projection={"_id": 1}, sort=[("created_at", -1)])
                     if recent_call:
                         mongo_client.calls.update_one(
                             {"_id": recent_call["_id"]},
@@ -282,15 +488,15 @@ async def end_call_tracking():
                             }}
                         )
                         print(f"✅ Updated existing initiated call record for {phone_to_log}")
-                        update_lead_status_from_call(phone_to_log, current_call_data["lead_id"], call_data)
+                        update_lead_status_from_call(phone_to_log, call.lead_id, call_data)
                     else:
-                        result = log_call(phone_to_log, current_call_data["lead_id"], call_data)
+                        result = log_call(phone_to_log, call.lead_id, call_data)
                         print(f"✅ Created new call record for {phone_to_log}")
                 except Exception as e:
                     print(f"⚠️ Error updating existing call: {e}")
-                    result = log_call(phone_to_log, current_call_data["lead_id"], call_data)
+                    result = log_call(phone_to_log, call.lead_id, call_data)
             else:
-                result = log_call(phone_to_log, current_call_data["lead_id"], call_data)
+                result = log_call(phone_to_log, call.lead_id, call_data)
                 print(f"✅ Created fallback call record")
         else:
             print("📞 Skipping log - no conversation data to save")
@@ -298,21 +504,15 @@ async def end_call_tracking():
     except Exception as e:
         print(f"❌ Error ending call tracking: {e}")
 
-    current_call_data = {
-        "phone_number": None,
-        "lead_id": None,
-        "transcription": [],
-        "ai_responses": [],
-        "start_time": None,
-        "end_time": None,
-        "call_session_id": None
-    }
-
 # ===========================
 # TTS (slow, SSML) + sender
 # ===========================
-async def ultra_fast_tts(text: str) -> Optional[bytes]:
-    """Async TTS using Google TTS with SSML prosody for slower, human-like delivery"""
+async def ultra_fast_tts(text: str) -> Optional[tuple[str, int]]:
+    """
+    Async TTS using Google TTS with SSML prosody for slower, human-like delivery.
+    Returns (audio_b64, raw_len_bytes): Google's base64 is passed through to Piopiy
+    as-is, so the PCM is never decoded and re-encoded.
+    """
     cleaned = (text or "").strip()
     if not cleaned:
         print("🔇 TTS skipped: empty text")
@@ -321,39 +521,125 @@ async def ultra_fast_tts(text: str) -> Optional[bytes]:
 
     ssml = text_to_ssml(cleaned)
 
-    async with httpx.AsyncClient(timeout=20) as client:
-        try:
-            payload = {
-                "input": {"ssml": ssml},
-                "voice": {"languageCode": "en-IN", "name": GOOGLE_TTS_VOICE},
-                "audioConfig": {
-                    "audioEncoding": "LINEAR16",
-                    "sampleRateHertz": 8000,
-                    "speakingRate": GOOGLE_TTS_RATE,
-                    "pitch": GOOGLE_TTS_PITCH,
-                    "effectsProfileId": ["telephony-class-application"]
-                }
-            }
-            response = await client.post(GOOGLE_TTS_URL, json=payload)
-            if response.status_code == 200:
-                audio_b64 = response.json().get("audioContent", "")
-                if audio_b64:
+    try:
+        payload = {"input": {"ssml": ssml}, **_TTS_TEMPLATE}
+        response = await _tts_client.post(GOOGLE_TTS_URL, content=orjson.dumps(payload), headers=_JSON_HEADERS)
+        if response.status_code == 200:
+            audio_b64 = response.json().get("audioContent", "")
+            if audio_b64:
+                raw_len = len(audio_b64) * 3 // 4 - audio_b64.count("=", -2)
+                print(f"✅ TTS HTTP 200, bytes: {raw_len}")
+                if SAVE_AUDIO_SAMPLES:
                     raw = base64.b64decode(audio_b64)
                     scipy.io.wavfile.write(f"tts_output_{int(time.time())}.wav", 8000, np.frombuffer(raw, dtype=np.int16))
-                    print(f"✅ TTS HTTP 200, bytes: {len(raw)}, saved to tts_output_{int(time.time())}.wav")
-                    return raw
-                print("⚠️ TTS success but empty audioContent")
-                return None
-            else:
-                print(f"⚠️ TTS HTTP {response.status_code}: {response.text[:200]}")
-                return None
-        except Exception as e:
-            print(f"❌ TTS request failed: {e}")
+                    print(f"🎵 Saved TTS audio to tts_output_{int(time.time())}.wav")
+                return audio_b64, raw_len
+            print("⚠️ TTS success but empty audioContent")
+            return None
+        else:
+            print(f"⚠️ TTS HTTP {response.status_code}: {response.text[:200]}")
             return None
+    except Exception as e:
+        print(f"❌ TTS request failed: {e}")
+        return None
+
+def enqueue_tts(text: str, fixed: bool = False):
+    """Queue bot text for TTS; fixed phrases are synthesized once and then replayed from cache"""
+    if fixed:
+        _phrase_audio_cache.setdefault(text, None)
+    current_call.get().tts_q.put_nowait(text)
+
+async def phrase_audio(text: str) -> Optional[tuple[str, int]]:
+    """TTS audio for a fixed phrase, synthesized on first use (or ahead of it by watch_phrase_cache)"""
+    audio = _phrase_audio_cache.get(text)
+    if audio is None:
+        audio = await ultra_fast_tts(text)
+        if audio:
+            _phrase_audio_cache[text] = audio
+    return audio
+
+async def warm_phrase_cache():
+    """Synthesize the fixed phrases not cached yet, dropping a greeting/exit the config no longer uses"""
+    global _config_phrases
+    static_phrases = (NUDGE_PROMPT, LLM_TIMEOUT_REPLY, LLM_AUTH_ERROR_REPLY, LLM_CONNECTION_ERROR_REPLY, LLM_ERROR_REPLY)
+    config_phrases = (qa_bot.get_greeting_message(), qa_bot.get_exit_message())
+    for stale in set(_config_phrases) - set(config_phrases) - set(static_phrases):
+        _phrase_audio_cache.pop(stale, None)
+    _config_phrases = config_phrases
+    phrases = config_phrases + static_phrases
+    for phrase in phrases:
+        _phrase_audio_cache.setdefault(phrase, None)
+    await asyncio.gather(*(phrase_audio(p) for p in phrases))
+    print(f"🎵 Cached TTS for {sum(1 for p in phrases if _phrase_audio_cache.get(p))}/{len(phrases)} fixed phrases")
+
+async def watch_phrase_cache(interval: float = PHRASE_WATCH_S):
+    """Warm the phrase cache, then re-warm it whenever agent_config's file signature changes"""
+    signature = agent_config.file_signature()
+    await warm_phrase_cache()
+    while True:
+        await asyncio.sleep(interval)
+        current = agent_config.file_signature()
+        if current != signature:
+            signature = current
+            await warm_phrase_cache()
+
+@router.on_event("startup")
+async def start_phrase_cache():
+    """Synthesize the fixed phrases in the background so calls skip the TTS round trip, in the call's own voice"""
+    global _phrase_warm_task
+    if GOOGLE_API_KEY and _phrase_warm_task is None:
+        _phrase_warm_task = asyncio.create_task(watch_phrase_cache())
+
+@router.on_event("shutdown")
+async def stop_phrase_cache():
+    """Stop the phrase cache watcher"""
+    global _phrase_warm_task
+    if _phrase_warm_task is not None:
+        _phrase_warm_task.cancel()
+        _phrase_warm_task = None
+
+@router.on_event("shutdown")
+async def close_tts_client():
+    """Close the shared TTS HTTP client on app shutdown"""
+    await _tts_client.aclose()
+
+try:
+    from piopiy import StreamAction
+except ImportError:
+    StreamAction = None  # Older piopiy SDKs; frames use the literal envelope below
+
+def _play_stream_envelope():
+    """
+    Split one StreamAction.playStream frame around its audio, so each chunk's frame is
+    a string concat. Falls back to the documented streamAudio JSON if the SDK lacks
+    StreamAction or its frame shape is unexpected.
+    """
+    marker = "UExBWVNUUkVBTQ=="  # Valid base64, so playStream accepts it
+    if StreamAction is not None:
+        try:
+            frame = StreamAction().playStream(audio_base64=marker, audio_type="raw", sample_rate=8000)
+            if isinstance(frame, str) and frame.count(marker) == 1:
+                prefix, suffix = frame.split(marker)
+                return prefix, suffix
+        except Exception as e:
+            print(f"⚠️ playStream template unavailable: {e}")
+    frame = orjson.dumps({
+        "type": "streamAudio",
+        "data": {"audioDataType": "raw", "sampleRate": 8000, "audioData": marker}
+    }).decode()
+    prefix, suffix = frame.split(marker)
+    return prefix, suffix
+
+PLAY_STREAM_ENVELOPE = _play_stream_envelope()
+
+def play_stream_message(audio_b64: str) -> str:
+    """Piopiy playStream frame for 8 kHz raw PCM, built from the cached envelope"""
+    prefix, suffix = PLAY_STREAM_ENVELOPE
+    return prefix + audio_b64 + suffix
 
 async def send_audio_ultra_fast(audio_b64: str, raw_len_bytes: int):
-    """Send audio to Piopiy WebSocket using StreamAction and set speaking window"""
-    global piopiy_ws
+    """Send audio to Piopiy WebSocket as a playStream frame and set speaking window"""
+    piopiy_ws = current_call.get().piopiy_ws
     if not piopiy_ws:
         print("⚠️ No active Piopiy WebSocket connection to send audio")
         return
@@ -362,10 +648,10 @@ async def send_audio_ultra_fast(audio_b64: str, raw_len_bytes: int):
     duration_s = raw_len_bytes / float(bytes_per_second)
     set_bot_speaking_for_seconds(duration_s)
 
+    message = play_stream_message(audio_b64)
     for attempt in range(3):
         try:
-            action = StreamAction()
-            await piopiy_ws.send_text(action.playStream(audio_base64=audio_b64, audio_type="raw", sample_rate=8000))
+            await piopiy_ws.send_text(message)
             print(f"📤 Sent audio chunk to Piopiy (≈{duration_s:.2f}s, {len(audio_b64)} b64 chars, attempt={attempt+1})")
             return
         except Exception as e:
@@ -378,40 +664,55 @@ async def send_audio_ultra_fast(audio_b64: str, raw_len_bytes: int):
 async def trigger_call_hangup():
     """Trigger call hangup by closing WebSocket connection"""
     try:
-        await log_call_message("system", "Triggering call hangup due to exit intent")
-        global piopiy_ws
+        log_call_message("system", "Triggering call hangup due to exit intent")
+        piopiy_ws = current_call.get().piopiy_ws
         if piopiy_ws:
             print("🛑 Closing Piopiy WebSocket connection")
             await piopiy_ws.close()
-            await log_call_message("system", "Piopiy WebSocket closed - call should end")
+            log_call_message("system", "Piopiy WebSocket closed - call should end")
         else:
             print("⚠️ No active Piopiy WebSocket connection")
-            await log_call_message("system", "No active Piopiy WebSocket found")
+            log_call_message("system", "No active Piopiy WebSocket found")
     except Exception as e:
         print(f"❌ Error triggering call hangup: {e}")
-        await log_call_message("system", f"Call hangup error: {str(e)}")
+        log_call_message("system", f"Call hangup error: {str(e)}")
 
 # ===========================
 # Workers
 # ===========================
 async def ultra_fast_tts_worker():
     """TTS processing worker (keeps voice slow & natural)"""
+    tts_q = current_call.get().tts_q
     while True:
         try:
-            if not tts_q.empty():
-                text = tts_q.get()
-                if text is None:
-                    print("🔇 TTS worker received None, stopping")
-                    break
-                print(f"🔔 TTS worker dequeued text: '{text[:80]}'")
-                raw_audio = await ultra_fast_tts(text)
-                if raw_audio:
-                    audio_b64 = base64.b64encode(raw_audio).decode()
-                    print(f"🎼 TTS bytes ready: {len(raw_audio)}")
-                    await send_audio_ultra_fast(audio_b64, raw_len_bytes=len(raw_audio))
+            text = await tts_q.get()
+            if text is None:
+                print("🔇 TTS worker received None, stopping")
+                break
+            print(f"🔔 TTS worker dequeued text: '{text[:80]}'")
+            if text in _phrase_audio_cache:
+                tts_audio = await phrase_audio(text)
+                if tts_audio:
+                    await send_audio_ultra_fast(*tts_audio)
                 else:
                     print(f"⚠️ No audio produced by TTS for text: '{text[:80]}'")
-            await asyncio.sleep(0.001)  # Reduced sleep for faster processing
+                continue
+            # Synthesize sentences concurrently but play them in order, so the
+            # first sentence starts while the rest are still being generated.
+            sentences = [s for s in _SENT_SPLIT.split(text.strip()) if s]
+            tts_tasks = [asyncio.create_task(ultra_fast_tts(s)) for s in sentences]
+            try:
+                for sentence, tts_task in zip(sentences, tts_tasks):
+                    tts_audio = await tts_task
+                    if tts_audio:
+                        audio_b64, raw_len = tts_audio
+                        print(f"🎼 TTS bytes ready: {raw_len}")
+                        await send_audio_ultra_fast(audio_b64, raw_len_bytes=raw_len)
+                    else:
+                        print(f"⚠️ No audio produced by TTS for text: '{sentence[:80]}'")
+            finally:
+                for tts_task in tts_tasks:
+                    tts_task.cancel()
         except Exception as e:
             print(f"⚠️ TTS worker error: {e}")
             await asyncio.sleep(0.1)
@@ -423,111 +724,134 @@ async def ultra_fast_llm_worker():
     - Ignores user inputs during bot speech to prevent overlap.
     - Processes transcriptions in order to maintain question-answer sync.
     """
-    bot = RealEstateQA(ai_services)
-    history = []
+    bot = qa_bot
+    call = current_call.get()
+    transcript_q = call.transcript_q
+    transcription_buffer = []  # (fragment, mono) pieces of the utterance being collected
+    mono = time.monotonic  # Interval timers only; wall-clock time is taken where it gets logged
+    history = deque(maxlen=6)  # Sliding window of the last three user/assistant turns
     session_started = False
-    last_activity = now()
-    last_transcription_time = now()
+    last_activity = mono()
+    last_transcription_time = mono()
 
     greeting = bot.get_greeting_message()
-    await log_call_message("greeting", greeting)
-    tts_q.put(greeting)
+    log_call_message("greeting", greeting)
+    enqueue_tts(greeting, fixed=True)
     print("📢 Sent initial greeting")
 
     while True:
         try:
-            if (now() - last_transcription_time).total_seconds() > NUDGE_AFTER_SILENCE_S and not bot_is_speaking():
-                prompt = "Are you still there? How can I assist you with real estate today?"
-                await log_call_message("bot", prompt)
-                tts_q.put(prompt)
-                print("📢 Sent prompt to encourage user speech")
-                last_transcription_time = now()
-
-            if (now() - last_activity).total_seconds() > END_AFTER_IDLE_S and session_started:
-                print("⏰ No activity for too long, ending session")
-                exit_message = bot.get_exit_message()
-                await log_call_message("exit", exit_message)
-                tts_q.put(exit_message)
-                await asyncio.sleep(3)
-                await trigger_call_hangup()
-                session_started = False
-                history = []
-                continue
-
-            if not transcript_q.empty():
-                if bot_is_speaking():
-                    print("🔇 Deferring transcription processing while bot is speaking")
-                    await asyncio.sleep(0.1)
-                    continue
-
-                first = transcript_q.get()
-                transcription_buffer.append((first, now()))
-                hold_until = now() + timedelta(milliseconds=LISTEN_HOLD_MS)
-
-                while now() < hold_until:
-                    if not transcript_q.empty():
-                        transcription_buffer.append((transcript_q.get(), now()))
-                        hold_until = now() + timedelta(milliseconds=LISTEN_HOLD_MS // 2)
-                    await asyncio.sleep(0.01)
-
-                user_text = " ".join(t[0].strip() for t in transcription_buffer if t[0] and t[0].strip())
-                transcription_buffer.clear()
-                if not user_text:
-                    continue
-
-                last_activity = now()
-                last_transcription_time = now()
-                if not session_started:
-                    session_started = True
-                    await log_call_message("system", f"Session started. First user input: {user_text}")
-
-                await log_call_message("user", user_text)
-
-                if bot.is_exit_intent(user_text):
+            # Block on the queue until a transcript arrives or the next nudge/idle deadline is due
+            timeout = NUDGE_AFTER_SILENCE_S - (mono() - last_transcription_time)
+            if session_started:
+                timeout = min(timeout, END_AFTER_IDLE_S - (mono() - last_activity))
+            try:
+                first = await asyncio.wait_for(transcript_q.get(), timeout=max(timeout, 0.1))
+            except asyncio.TimeoutError:
+                if (mono() - last_transcription_time) > NUDGE_AFTER_SILENCE_S and not bot_is_speaking():
+                    log_call_message("bot", NUDGE_PROMPT)
+                    enqueue_tts(NUDGE_PROMPT, fixed=True)
+                    print("📢 Sent prompt to encourage user speech")
+                    last_transcription_time = mono()
+
+                if (mono() - last_activity) > END_AFTER_IDLE_S and session_started:
+                    print("⏰ No activity for too long, ending session")
                     exit_message = bot.get_exit_message()
-                    await log_call_message("exit", exit_message)
-                    tts_q.put(exit_message)
+                    log_call_message("exit", exit_message)
+                    enqueue_tts(exit_message, fixed=True)
                     await asyncio.sleep(3)
                     await trigger_call_hangup()
                     session_started = False
-                    history = []
-                    continue
+                    history.clear()
+                continue
+
+            # Sleep until the speaking deadline instead of polling; re-check in case it was extended
+            if (speaking_left := call.bot_speaking_until_mono - mono()) > 0:
+                print("🔇 Deferring transcription processing while bot is speaking")
+                while speaking_left > 0:
+                    await asyncio.sleep(speaking_left)
+                    speaking_left = call.bot_speaking_until_mono - mono()
+
+            transcription_buffer.append((first, mono()))
+            hold_until = mono() + LISTEN_HOLD_MS / 1000.0
 
+            # Catch add-on fragments: each one extends the hold, silence until the deadline ends it
+            while (remaining := hold_until - mono()) > 0:
                 try:
-                    start_time = now()
+                    fragment = await asyncio.wait_for(transcript_q.get(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
+                transcription_buffer.append((fragment, mono()))
+                hold_until = mono() + LISTEN_HOLD_MS / 2000.0
+
+            user_text = " ".join(filter(None, (t[0].strip() for t in transcription_buffer if t[0])))
+            transcription_buffer.clear()
+            if not user_text:
+                continue
+
+            last_activity = mono()
+            last_transcription_time = mono()
+            if not session_started:
+                session_started = True
+                log_call_message("system", f"Session started. First user input: {user_text}")
+
+            log_call_message("user", user_text)
+
+            if bot.is_exit_intent(user_text):
+                exit_message = bot.get_exit_message()
+                log_call_message("exit", exit_message)
+                enqueue_tts(exit_message, fixed=True)
+                await asyncio.sleep(3)
+                await trigger_call_hangup()
+                session_started = False
+                history.clear()
+                continue
+
+            try:
+                start_time = mono()
+                recent_history = list(history)
+                cache_key = response_cache_key(user_text, recent_history)
+                cached = _response_cache.get(cache_key)
+                if cached is not None and cached[0] <= mono():
+                    del _response_cache[cache_key]
+                    cached = None
+                if cached is not None:
+                    reply = cached[1]
+                    _response_cache.move_to_end(cache_key)
+                    print("⚡ LLM response served from cache")
+                else:
                     reply = await asyncio.wait_for(
-                        asyncio.get_event_loop().run_in_executor(None, bot.get_response, user_text, history),
+                        asyncio.get_event_loop().run_in_executor(None, bot.get_response, user_text, recent_history),
                         timeout=12.0
                     )
-                    response_time = (now() - start_time).total_seconds()
+                    # get_response swallows LLM errors and returns canned text; never cache that
+                    if not bot.is_fallback(user_text, reply):
+                        _response_cache[cache_key] = (mono() + RESPONSE_CACHE_TTL_S, reply)
+                        if len(_response_cache) > RESPONSE_CACHE_SIZE:
+                            _response_cache.popitem(last=False)
+                    response_time = mono() - start_time
                     print(f"⏱️ LLM response generated in {response_time:.2f}s")
-                    await log_call_message("bot", reply)
-                    tts_q.put(reply)
-                    print(f"📢 Queued bot response: '{reply[:80]}'")
-                except asyncio.TimeoutError:
-                    print("⚠️ LLM response timeout, sending fallback")
-                    reply = "I'm sorry, I'm taking a bit longer. Could you please repeat or clarify what you'd like help with?"
-                    await log_call_message("bot", reply)
-                    tts_q.put(reply)
-                except Exception as e:
-                    print(f"⚠️ Error generating response: {e}, type: {type(e).__name__}")
-                    if "api_key" in str(e).lower() or "authentication" in str(e).lower():
-                        reply = "I'm sorry, there's an authentication issue with my AI service. Please check the API configuration."
-                    elif "connection" in str(e).lower() or "timeout" in str(e).lower():
-                        reply = "I'm sorry, I'm having trouble connecting to my AI service. Please try again."
-                    else:
-                        reply = "I'm sorry, I encountered an error. Please try again."
-                    await log_call_message("bot", reply)
-                    tts_q.put(reply)
-
-                history.extend([
-                    {"role": "user", "content": user_text},
-                    {"role": "assistant", "content": reply}
-                ])
-                if len(history) > 8:
-                    history = history[-6:]
-
-            await asyncio.sleep(0.001)  # Reduced sleep for faster processing
+                log_call_message("bot", reply)
+                enqueue_tts(reply)
+                print(f"📢 Queued bot response: '{reply[:80]}'")
+            except asyncio.TimeoutError:
+                print("⚠️ LLM response timeout, sending fallback")
+                reply = LLM_TIMEOUT_REPLY
+                log_call_message("bot", reply)
+                enqueue_tts(reply, fixed=True)
+            except Exception as e:
+                print(f"⚠️ Error generating response: {e}, type: {type(e).__name__}")
+                if "api_key" in str(e).lower() or "authentication" in str(e).lower():
+                    reply = LLM_AUTH_ERROR_REPLY
+                elif "connection" in str(e).lower() or "timeout" in str(e).lower():
+                    reply = LLM_CONNECTION_ERROR_REPLY
+                else:
+                    reply = LLM_ERROR_REPLY
+                log_call_message("bot", reply)
+                enqueue_tts(reply, fixed=True)
+
+            history.append({"role": "user", "content": user_text})
+            history.append({"role": "assistant", "content": reply})
         except Exception as e:
             print(f"⚠️ LLM worker error: {e}")
             await asyncio.sleep(0.1)
@@ -535,88 +859,101 @@ async def ultra_fast_llm_worker():
 # ===========================
 # Deepgram WebSocket client
 # ===========================
-def start_fast_deepgram():
-    """Start Deepgram WebSocket client with reconnection logic"""
-    global dg_ws_client
+def handle_deepgram_message(message):
+    """Queue final transcripts from a Deepgram results frame"""
+    try:
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Deepgram message: %s", message[:200])
+        if _DG_RESULTS_RE.search(message) and not _DG_FINAL_RE.search(message):
+            return  # Interim result: nothing to queue
+        data = orjson.loads(message)
+        if data.get("type") == "Results":
+            alt = data.get("channel", {}).get("alternatives", [{}])[0]
+            transcript = alt.get("transcript", "")
+            confidence = alt.get("confidence", 0.0)
+            is_final = (
+                    bool(data.get("is_final")) or
+                    bool(data.get("speech_final")) or
+                    bool(data.get("final")) or
+                    bool(data.get("channel", {}).get("is_final")) or
+                    bool(alt.get("final"))
+            )
+            if transcript and is_final:
+                if bot_is_speaking():
+                    print(f"🔇 Ignored transcript while bot speaking: '{transcript}'")
+                    return
+                print(f"🎧 ASR (final, confidence={confidence:.2f}): {transcript}")
+                current_call.get().transcript_q.put_nowait(transcript)
+                print(f"📢 Transcription queued: '{transcript[:80]}'")
+            else:
+                logger.debug("No valid transcript (transcript=%r, is_final=%s, confidence=%.2f)", transcript, is_final, confidence)
+        else:
+            print(f"ℹ️ Non-results Deepgram message: {data.get('type')}")
+    except Exception as e:
+        print(f"⚠️ Deepgram message parse error: {e}")
 
-    def on_open(ws):
-        print("✅ Deepgram WebSocket connected")
-        def keep_alive():
-            while ws.sock and ws.sock.connected:
-                try:
-                    ws.send('{"type":"KeepAlive"}')
-                    time.sleep(8)
-                except Exception as e:
-                    print(f"⚠️ Deepgram keep-alive error: {e}")
-                    break
-        threading.Thread(target=keep_alive, daemon=True).start()
+async def deepgram_keep_alive(ws):
+    """Send Deepgram a KeepAlive whenever no audio has gone out for DG_KEEPALIVE_IDLE_S"""
+    call = current_call.get()
+    try:
+        while True:
+            idle = time.monotonic() - call.dg_last_send
+            if idle >= DG_KEEPALIVE_IDLE_S:
+                await ws.send('{"type":"KeepAlive"}')
+                call.dg_last_send = time.monotonic()
+                idle = 0.0
+            await asyncio.sleep(DG_KEEPALIVE_IDLE_S - idle)
+    except Exception as e:
+        print(f"⚠️ Deepgram keep-alive error: {e}")
 
-    def on_message(ws, message):
+async def deepgram_sender(ws):
+    """Single writer for caller audio, so the receive loop never waits on Deepgram's socket"""
+    call = current_call.get()
+    while True:
+        data = await call.dg_send_q.get()
         try:
-            data = json.loads(message)
-            print(f"📥 Deepgram message: {json.dumps(data)[:200]}")
-            if data.get("type") == "Results":
-                alt = data.get("channel", {}).get("alternatives", [{}])[0]
-                transcript = alt.get("transcript", "")
-                confidence = alt.get("confidence", 0.0)
-                is_final = (
-                        bool(data.get("is_final")) or
-                        bool(data.get("speech_final")) or
-                        bool(data.get("final")) or
-                        bool(data.get("channel", {}).get("is_final")) or
-                        bool(alt.get("final"))
-                )
-                if transcript and is_final:
-                    if bot_is_speaking():
-                        print(f"🔇 Ignored transcript while bot speaking: '{transcript}'")
-                        return
-                    print(f"🎧 ASR (final, confidence={confidence:.2f}): {transcript}")
-                    transcript_q.put(transcript)
-                    print(f"📢 Transcription queued: '{transcript[:80]}'")
-                else:
-                    print(f"⚠️ No valid transcript (transcript='{transcript}', is_final={is_final}, confidence={confidence:.2f})")
-            else:
-                print(f"ℹ️ Non-results Deepgram message: {data.get('type')}")
+            await ws.send(data)
+            call.dg_last_send = time.monotonic()
+        finally:
+            call.dg_send_q.task_done()
+
+async def deepgram_session():
+    """Keep the current call's Deepgram stream open on the event loop, reconnecting after drops"""
+    call = current_call.get()
+    headers = {"Authorization": f"Token {DEEPGRAM_API_KEY}"}
+    while True:
+        try:
+            async with ws_connect(DG_WS_URL, additional_headers=headers, max_size=None, compression=None) as ws:
+                call.dg_ws = ws
+                call.dg_connected.set()
+                print("✅ Deepgram WebSocket connected")
+                keep_alive_task = asyncio.create_task(deepgram_keep_alive(ws))
+                sender_task = asyncio.create_task(deepgram_sender(ws))
+                try:
+                    async for message in ws:
+                        handle_deepgram_message(message)
+                finally:
+                    keep_alive_task.cancel()
+                    sender_task.cancel()
+                print(f"ℹ️ Deepgram WS closed: {ws.close_code} {ws.close_reason}")
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
-            print(f"⚠️ Deepgram message parse error: {e}")
-
-    def on_error(ws, error):
-        print(f"⚠️ Deepgram WS error: {error}")
-        reconnect_deepgram()
-
-    def on_close(ws, close_status_code, close_msg):
-        print(f"ℹ️ Deepgram WS closed: {close_status_code} {close_msg}")
-        reconnect_deepgram()
-
-    def reconnect_deepgram():
-        global dg_ws_client
+            print(f"⚠️ Deepgram WS error: {e}")
+        finally:
+            call.dg_ws = None
+            call.dg_connected.clear()
         print("🔄 Attempting to reconnect Deepgram WebSocket...")
-        time.sleep(5)
-        if DEEPGRAM_API_KEY:
-            headers = {"Authorization": f"Token {DEEPGRAM_API_KEY}"}
-            dg_ws_client = WebSocketApp(
-                DG_WS_URL,
-                header=headers,
-                on_open=on_open,
-                on_message=on_message,
-                on_close=on_close,
-                on_error=on_error
-            )
-            threading.Thread(target=dg_ws_client.run_forever, daemon=True).start()
+        await asyncio.sleep(5)
 
-    if DEEPGRAM_API_KEY:
-        headers = {"Authorization": f"Token {DEEPGRAM_API_KEY}"}
-        dg_ws_client = WebSocketApp(
-            DG_WS_URL,
-            header=headers,
-            on_open=on_open,
-            on_message=on_message,
-            on_close=on_close,
-            on_error=on_error
-        )
-        threading.Thread(target=dg_ws_client.run_forever, daemon=True).start()
-    else:
+def start_fast_deepgram():
+    """Start the current call's Deepgram connection task (runs on the event loop, no threads)"""
+    call = current_call.get()
+    if not DEEPGRAM_API_KEY:
         print("❌ Deepgram API key missing")
+        return
+    if call.dg_task is None or call.dg_task.done():
+        call.dg_task = asyncio.create_task(deepgram_session())
 
 def get_websocket_url():
     """Get WebSocket URL based on environment"""
@@ -632,170 +969,201 @@ def get_websocket_url():
 # ===========================
 # WebSocket endpoint
 # ===========================
+def _extract_context(d) -> tuple[Optional[str], Optional[str], Optional[str]]:
+    """Pull (phone, lead_id, session) out of an extra_params/meta dict."""
+    if not isinstance(d, dict):
+        return None, None, None
+    return d.get("phone_number") or d.get("phone"), d.get("lead_id"), d.get("session") or d.get("sid")
+
+async def handle_session_id(session_id: str):
+    """Adopt a bare session-id text frame and pull phone/lead from its initiated call."""
+    call = current_call.get()
+    print(f"📋 Treating text as session_id: {session_id}")
+    call.call_session_id = session_id
+    log_call_message("system", f"Updated session_id: {session_id}")
+    try:
+        recent_call = await get_recent_call(session_id)
+        if recent_call:
+            call.phone_number = recent_call.get("phone_number", "unknown")
+            call.lead_id = recent_call.get("lead_id")
+            print(f"📋 Matched recent call: phone={call.phone_number}, lead_id={call.lead_id}")
+    except Exception as e:
+        print(f"⚠️ Error finding recent call by session_id: {e}")
+
+async def handle_text_message(text: str, session_id: Optional[str] = None):
+    """Apply session/context metadata carried by a text frame."""
+    # JSON context frames are the common case; only '{'/'[' frames reach the parser.
+    # %.200s truncates inside the logger, so nothing is sliced unless DEBUG is on.
+    if text.lstrip()[:1] not in ("{", "["):
+        if _UUID_RE.fullmatch(text):
+            await handle_session_id(text)
+        else:
+            logger.debug("Ignoring non-JSON text message: %.200s", text)
+        return
+    try:
+        call = current_call.get()
+        data = orjson.loads(text)
+        logger.debug("Parsed JSON text message: %.200s", text)
+        # meta (or the top level when there is no meta key) wins over extra_params
+        phone_e, lead_e, sess_e = _extract_context(data.get("extra_params"))
+        phone_m, lead_m, sess_m = _extract_context(data.get("meta", data))
+        phone = phone_m or phone_e
+        lead_id = lead_m or lead_e
+        sess = sess_m or sess_e or session_id
+        if phone:
+            call.phone_number = str(phone)
+        if lead_id:
+            call.lead_id = str(lead_id)
+        if sess:
+            call.call_session_id = str(sess)
+        log_call_message("system", f"Call context: phone={phone}, lead_id={lead_id}, session={sess}")
+    except orjson.JSONDecodeError as e:
+        print(f"⚠️ Non-JSON text message received: {text[:200]}, error: {e}")
+    except Exception as e:
+        print(f"⚠️ Error processing text message: {e}, message: {text[:200]}")
+
+async def close_deepgram():
+    """Send Deepgram the caller audio still buffered (after the chunks already queued), then close the call's stream"""
+    call = current_call.get()
+    try:
+        if call.audio_ring and call.dg_ws is not None:
+            processed_audio = fast_audio_convert(call.audio_ring.pop_view(len(call.audio_ring)))
+            call.dg_send_q.put_nowait(processed_audio)
+            print(f"📤 Flushed {len(processed_audio)} bytes to Deepgram on close")
+        if call.dg_ws is not None:
+            await asyncio.wait_for(call.dg_send_q.join(), timeout=DG_FLUSH_TIMEOUT_S)
+    except asyncio.TimeoutError:
+        print("⚠️ Deepgram flush timed out")
+    except Exception as e:
+        print(f"⚠️ Flush error: {e}")
+    if call.dg_task is not None:
+        await stop_workers(call.dg_task)
+
+async def stop_workers(*tasks: asyncio.Task):
+    """Cancel the per-call workers and wait for all of them to finish"""
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
 @router.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     """WebSocket client handler with improved question-answer sync"""
-    global piopiy_ws, audio_buffer
-    piopiy_ws = websocket
-
     await websocket.accept()
     ws_url = get_websocket_url()
     env_type = "Production (Render)" if os.getenv("RENDER_EXTERNAL_URL") else "Development"
     print(f"🔗 WebSocket available at: {ws_url} [{env_type}]")
     print(f"📞 WebSocket client connected from: {websocket.client}")
 
-    session_id = None
-    extracted_phone = "unknown"
-    extracted_lead_id = None
-    try:
-        query_params = parse_qs(urlparse(websocket.scope["path"]).query)
-        extracted_phone = query_params.get("phone_number", ["unknown"])[0] or query_params.get("phone", ["unknown"])[0]
-        extracted_lead_id = query_params.get("lead_id", [None])[0]
-        session_id = query_params.get("session", [None])[0] or query_params.get("sid", [None])[0]
-        print(f"📋 Extracted from query params: phone={extracted_phone}, lead_id={extracted_lead_id}, session={session_id}")
-    except Exception as e:
-        print(f"⚠️ Error parsing query parameters: {e}")
+    # Starlette parses the query string once; scope["path"] never carries it
+    query_params = websocket.query_params
+    extracted_phone = query_params.get("phone_number") or query_params.get("phone") or "unknown"
+    extracted_lead_id = query_params.get("lead_id")
+    session_id = query_params.get("session") or query_params.get("sid")
+    print(f"📋 Extracted from query params: phone={extracted_phone}, lead_id={extracted_lead_id}, session={session_id}")
 
-    await start_call_tracking(
+    call_token = await start_call_tracking(
         phone_number=extracted_phone,
         lead_id=extracted_lead_id,
-        call_session_id=session_id
+        call_session_id=session_id,
+        piopiy_ws=websocket
     )
 
-    if mongo_client and mongo_client.is_connected() and session_id:
+    call = current_call.get()
+    audio_ring, dg_out_samples = call.audio_ring, call.dg_out_samples
+    # Only look the call up when the query string left phone or lead unknown
+    if session_id and (extracted_phone == "unknown" or not extracted_lead_id):
         try:
-            recent_call = mongo_client.calls.find_one({
-                "call_session_id": session_id,
-                "status": "initiated",
-                "created_at": {"$gte": datetime.now() - timedelta(minutes=5)}
-            }, sort=[("created_at", -1)])
+            recent_call = await get_recent_call(session_id)
             if recent_call:
-                current_call_data["phone_number"] = recent_call.get("phone_number", extracted_phone)
-                current_call_data["lead_id"] = recent_call.get("lead_id", extracted_lead_id)
-                print(f"📋 Updated call context from MongoDB: phone={current_call_data['phone_number']}, lead_id={current_call_data['lead_id']}")
+                call.phone_number = recent_call.get("phone_number", extracted_phone)
+                call.lead_id = recent_call.get("lead_id", extracted_lead_id)
+                print(f"📋 Updated call context from MongoDB: phone={call.phone_number}, lead_id={call.lead_id}")
         except Exception as e:
             print(f"⚠️ Error updating call context from MongoDB: {e}")
 
     tts_task = asyncio.create_task(ultra_fast_tts_worker())
     llm_task = asyncio.create_task(ultra_fast_llm_worker())
 
-    if not dg_ws_client and DEEPGRAM_API_KEY:
+    if DEEPGRAM_API_KEY:
         start_fast_deepgram()
-        await asyncio.sleep(1)
+        try:
+            await asyncio.wait_for(call.dg_connected.wait(), timeout=1)
+        except asyncio.TimeoutError:
+            print("⚠️ Deepgram not connected yet; audio will be dropped until it is")
 
     try:
+        # Handshake phase: JSON/session text frames until the audio stream starts
         while True:
             message = await websocket.receive()
-            if message["type"] == "websocket.disconnect":
-                print("🔌 WebSocket client disconnected")
+            if message["type"] == "websocket.disconnect" or message.get("bytes") is not None:
                 break
-            elif message["type"] == "websocket.receive":
-                if "text" in message:
-                    try:
-                        print(f"📝 Received text message: {message['text'][:200]}...")
-                        if message["text"].replace("-", "").isalnum() and len(message["text"]) == 36:
-                            print(f"📋 Treating text as session_id: {message['text']}")
-                            current_call_data["call_session_id"] = message["text"]
-                            await log_call_message("system", f"Updated session_id: {message['text']}")
-                            if mongo_client and mongo_client.is_connected():
-                                try:
-                                    recent_call = mongo_client.calls.find_one({
-                                        "call_session_id": message["text"],
-                                        "status": "initiated",
-                                        "created_at": {"$gte": datetime.now() - timedelta(minutes=5)}
-                                    }, sort=[("created_at", -1)])
-                                    if recent_call:
-                                        current_call_data["phone_number"] = recent_call.get("phone_number", "unknown")
-                                        current_call_data["lead_id"] = recent_call.get("lead_id")
-                                        print(f"📋 Matched recent call: phone={current_call_data['phone_number']}, lead_id={current_call_data['lead_id']}")
-                                except Exception as e:
-                                    print(f"⚠️ Error finding recent call by session_id: {e}")
-                            continue
-
-                        data = json.loads(message["text"])
-                        print(f"📋 Parsed JSON: {data}")
-                        extra_params = data.get("extra_params")
-                        if extra_params:
-                            phone = extra_params.get("phone_number") or extra_params.get("phone")
-                            lead_id = extra_params.get("lead_id")
-                            sess = extra_params.get("session") or extra_params.get("sid")
-                            if phone:
-                                current_call_data["phone_number"] = str(phone)
-                            if lead_id:
-                                current_call_data["lead_id"] = str(lead_id)
-                            if sess:
-                                current_call_data["call_session_id"] = str(sess)
-                            await log_call_message("system", f"Call context: phone={phone}, lead_id={lead_id}, session={sess}")
-
-                        meta = data.get("meta", data)
-                        if isinstance(meta, dict):
-                            phone = meta.get("phone_number") or meta.get("phone")
-                            lead_id = meta.get("lead_id")
-                            sess = meta.get("session") or meta.get("sid") or session_id
-                            if phone:
-                                current_call_data["phone_number"] = str(phone)
-                            if lead_id:
-                                current_call_data["lead_id"] = str(lead_id)
-                            if sess:
-                                current_call_data["call_session_id"] = str(sess)
-                            await log_call_message("system", f"Call context from meta: phone={phone}, lead_id={lead_id}, session={sess}")
-                    except json.JSONDecodeError as e:
-                        print(f"⚠️ Non-JSON text message received: {message['text'][:200]}, error: {e}")
-                    except Exception as e:
-                        print(f"⚠️ Error processing text message: {e}, message: {message['text'][:200]}")
-
-                elif "bytes" in message:
-                    try:
-                        incoming = message["bytes"]
-                        print(f"🎵 Received audio data: {len(incoming)} bytes")
-                        if bot_is_speaking():
-                            print(f"🔇 Dropped {len(incoming)} bytes while bot speaking")
-                            audio_buffer.clear()
-                            continue
-
-                        audio_buffer.extend(incoming)
-                        while len(audio_buffer) >= AUDIO_BUFFER_SIZE:
-                            chunk = audio_buffer[:AUDIO_BUFFER_SIZE]
-                            del audio_buffer[:AUDIO_BUFFER_SIZE]
-                            if dg_ws_client and dg_ws_client.sock and dg_ws_client.sock.connected:
+            if message.get("text") is not None:
+                await handle_text_message(message["text"], session_id)
+
+        # Audio phase: binary frames go straight into the ring buffer;
+        # late text frames are rare and handled off the fast path.
+        bytes_in = bytes_sent = bytes_dropped = 0
+        stats_at = time.monotonic()
+        out_slot = 0
+        while message["type"] != "websocket.disconnect":
+            incoming = message.get("bytes")
+            if incoming is None:
+                if message.get("text") is not None:
+                    await handle_text_message(message["text"], session_id)
+            else:
+                try:
+                    bytes_in += len(incoming)
+                    if bot_is_speaking():
+                        bytes_dropped += len(incoming)
+                        audio_ring.reset()
+                    else:
+                        audio_ring.extend(memoryview(incoming))
+                        while len(audio_ring) >= AUDIO_BUFFER_SIZE:
+                            chunk = audio_ring.pop_view(AUDIO_BUFFER_SIZE)
+                            if call.dg_ws is not None:
                                 try:
-                                    processed_audio = await asyncio.get_event_loop().run_in_executor(None, fast_audio_convert, bytes(chunk))
-                                    dg_ws_client.send(processed_audio, opcode=ABNF.OPCODE_BINARY)
-                                    print(f"📤 Sent {len(processed_audio)} bytes of buffered audio to Deepgram")
+                                    # Filter straight from the ring into the next output slot and queue
+                                    # that view for the sender task: no per-chunk bytes objects.
+                                    processed_audio = fast_audio_convert(chunk, out=dg_out_samples[out_slot])
+                                    out_slot = (out_slot + 1) % len(dg_out_samples)
+                                    call.dg_send_q.put_nowait(processed_audio)
+                                    bytes_sent += len(processed_audio)
+                                except asyncio.QueueFull:
+                                    print("⚠️ Deepgram send queue full; dropping chunk")
+                                    audio_ring.reset()
+                                    break
                                 except Exception as e:
                                     print(f"⚠️ Failed to send chunk to Deepgram: {e}")
-                                    audio_buffer.clear()
+                                    audio_ring.reset()
                                     break
                             else:
                                 print("⚠️ Deepgram WS not connected; dropping chunk")
-                                audio_buffer.clear()
+                                audio_ring.reset()
                                 break
-                    except Exception as e:
-                        print(f"⚠️ Error processing audio data: {e}")
-                        audio_buffer.clear()
+                except Exception as e:
+                    print(f"⚠️ Error processing audio data: {e}")
+                    audio_ring.reset()
+                elapsed = time.monotonic() - stats_at
+                if elapsed >= AUDIO_STATS_INTERVAL_S:
+                    print(f"🎵 Audio {elapsed:.1f}s: received {bytes_in} B, sent {bytes_sent} B to Deepgram, dropped {bytes_dropped} B while bot speaking")
+                    bytes_in = bytes_sent = bytes_dropped = 0
+                    stats_at += elapsed
+            message = await websocket.receive()
+        print("🔌 WebSocket client disconnected")
     except Exception as e:
         print(f"❌ WebSocket connection error: {e}")
     finally:
-        try:
-            if audio_buffer and dg_ws_client and dg_ws_client.sock and dg_ws_client.sock.connected:
-                processed_audio = await asyncio.get_event_loop().run_in_executor(None, fast_audio_convert, bytes(audio_buffer))
-                dg_ws_client.send(processed_audio, opcode=ABNF.OPCODE_BINARY)
-                print(f"📤 Flushed {len(processed_audio)} bytes to Deepgram on close")
-        except Exception as e:
-            print(f"⚠️ Flush error: {e}")
-
         print("🔌 WebSocket client disconnected - ending call tracking")
-        await end_call_tracking()
-        tts_task.cancel()
-        llm_task.cancel()
+        # Independent teardown steps run concurrently; close latency is the slowest one, not the sum
         try:
-            await tts_task
-            await llm_task
-        except asyncio.CancelledError:
-            pass
-        piopiy_ws = None
-        audio_buffer.clear()
-        transcription_buffer.clear()
+            async with asyncio.TaskGroup() as tg:
+                tg.create_task(close_deepgram())
+                tg.create_task(end_call_tracking())
+                tg.create_task(stop_workers(tts_task, llm_task))
+        except Exception as e:
+            print(f"⚠️ Teardown error: {e}")
+        call.piopiy_ws = None
+        current_call.reset(call_token)
 
 # ---------------------------
 # Startup logs
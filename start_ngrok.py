@@ -9,9 +9,43 @@ import sys
 import time
 import os
 import requests
-import json
+import orjson
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from config import NGROK_API
 
+# One pooled keep-alive session for every request, with retry/backoff on transient errors.
+# Refused connects are not retried here: wait_for_tunnels polls until ngrok is listening.
+SESSION = requests.Session()
+SESSION.mount("http://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=4,
+    max_retries=Retry(total=2, connect=0, backoff_factor=0.3, status_forcelist=[502, 503, 504],
+                      allowed_methods={"GET", "PUT", "POST"}, raise_on_status=False),
+))
+
+
+def wait_for_tunnels(process, budget_s=15.0):
+    """
+    Poll the ngrok admin API with backoff until at least one tunnel is listed.
+    Returns the tunnels, [] if the API answered without any, or None if it never answered.
+    """
+    tunnels = None
+    deadline = time.monotonic() + budget_s
+    delay = 0.1
+    while time.monotonic() < deadline and process.poll() is None:
+        try:
+            response = SESSION.get(f"{NGROK_API}/api/tunnels", timeout=1)
+            if response.ok:
+                tunnels = orjson.loads(response.content).get("tunnels", [])
+                if tunnels:
+                    return tunnels
+        except requests.RequestException:
+            pass
+        time.sleep(delay)
+        delay = min(delay * 1.5, 1.0)
+    return tunnels
+
 
 def start_ngrok():
     """Start ngrok with the configuration file and keep it running."""
@@ -33,13 +67,11 @@ def start_ngrok():
             "ngrok", "start", "--all", "--config", config_path
         ])
 
-        # Wait a bit for ngrok to start
-        time.sleep(3)
-
-        # Check if ngrok is running
+        # Wait until ngrok reports its tunnels (or the startup budget runs out)
         try:
-            response = requests.get(f"{NGROK_API}/api/tunnels", timeout=5)
-            tunnels = response.json().get("tunnels", [])
+            tunnels = wait_for_tunnels(process)
+            if tunnels is None:
+                raise requests.exceptions.ConnectionError("ngrok admin API not reachable")
 
             if not tunnels:
                 print("❌ No tunnels found. Ngrok may not have started properly.")
@@ -99,12 +131,10 @@ def start_ngrok():
         # Keep ngrok running and monitor the child process
         print("🔄 Ngrok is running. Press Ctrl+C to stop...")
         try:
-            while True:
-                ret = process.poll()
-                if ret is not None:
-                    print(f"🛑 Ngrok process exited with code {ret}")
-                    return False
-                time.sleep(2)
+            # Blocks in the kernel until ngrok exits; Ctrl+C still raises KeyboardInterrupt
+            ret = process.wait()
+            print(f"🛑 Ngrok process exited with code {ret}")
+            return False
         except KeyboardInterrupt:
             print("\n🛑 Stopping ngrok...")
             try:
@@ -124,12 +154,15 @@ def start_ngrok():
         return False
 
 
-def check_ngrok_auth():
-    """Check if ngrok is authenticated"""
+def check_ngrok():
+    """
+    Probe ngrok once: raises FileNotFoundError if the binary is missing,
+    returns True if its config (including the authtoken) validates.
+    """
     try:
-        result = subprocess.run(["ngrok", "config", "check"], capture_output=True, text=True)
+        result = subprocess.run(["ngrok", "config", "check"], capture_output=True, text=True, timeout=3)
         return result.returncode == 0
-    except Exception:
+    except subprocess.TimeoutExpired:
         return False
 
 
@@ -138,16 +171,15 @@ def main():
     print("🎯 AI Agent Ngrok Tunnel Setup")
     print("=" * 40)
 
-    # Check if ngrok is installed
+    # One probe checks both that ngrok is installed and that it is authenticated
     try:
-        subprocess.run(["ngrok", "version"], check=True, capture_output=True)
-    except (subprocess.CalledProcessError, FileNotFoundError):
+        authenticated = check_ngrok()
+    except OSError:
         print("❌ Ngrok is not installed or not in PATH")
         print("Please install ngrok from: https://ngrok.com/download")
         sys.exit(1)
 
-    # Check if ngrok is authenticated
-    if not check_ngrok_auth():
+    if not authenticated:
         print("⚠️  Ngrok may not be authenticated.")
         print("If you encounter auth errors, run: ngrok config add-authtoken YOUR_TOKEN")
         print()
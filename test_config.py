@@ -4,11 +4,23 @@ Test script for Agent Configuration System
 Tests all configuration functionality
 """
 
-import json
+import orjson
 import requests
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from agent_config import AgentConfig
 
+# One pooled keep-alive session for every request, with retry/backoff on transient errors
+SESSION = requests.Session()
+SESSION.mount("http://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=4,
+    max_retries=Retry(total=2, backoff_factor=0.3, status_forcelist=[502, 503, 504],
+                      allowed_methods={"GET", "PUT", "POST"}, raise_on_status=False),
+))
+
 def test_agent_config_class():
     """Test the AgentConfig class functionality"""
     print("🧪 Testing AgentConfig class...")
@@ -53,7 +65,7 @@ def test_api_endpoints():
     
     try:
         # Test health endpoint
-        response = requests.get(f"{base_url}/api/health", timeout=5)
+        response = SESSION.get(f"{base_url}/api/health", timeout=5)
         if response.status_code == 200:
             print("✅ Health endpoint working")
         else:
@@ -61,9 +73,9 @@ def test_api_endpoints():
             return False
         
         # Test get config
-        response = requests.get(f"{base_url}/api/config", timeout=5)
+        response = SESSION.get(f"{base_url}/api/config", timeout=5)
         if response.status_code == 200:
-            config_data = response.json()
+            config_data = orjson.loads(response.content)
             if config_data.get("success"):
                 print("✅ Get config endpoint working")
                 current_config = config_data["data"]
@@ -81,14 +93,14 @@ def test_api_endpoints():
             "system_prompt": "Test API prompt"
         }
         
-        response = requests.put(
+        response = SESSION.put(
             f"{base_url}/api/config",
             json=test_update,
             timeout=5
         )
         
         if response.status_code == 200:
-            update_data = response.json()
+            update_data = orjson.loads(response.content)
             if update_data.get("success"):
                 print("✅ Update config endpoint working")
             else:
@@ -105,15 +117,22 @@ def test_api_endpoints():
             ("/api/config/prompt", {"prompt": "Test individual prompt"})
         ]
         
-        for endpoint, data in individual_tests:
-            response = requests.post(f"{base_url}{endpoint}", json=data, timeout=5)
-            if response.status_code == 200:
-                print(f"✅ {endpoint} working")
-            else:
-                print(f"❌ {endpoint} failed: {response.status_code}")
+        # Each endpoint writes a different key, so they can run concurrently
+        with ThreadPoolExecutor(max_workers=len(individual_tests)) as executor:
+            futures = {
+                executor.submit(SESSION.post, f"{base_url}{endpoint}", json=data, timeout=5): endpoint
+                for endpoint, data in individual_tests
+            }
+            for future in as_completed(futures):
+                endpoint = futures[future]
+                response = future.result()
+                if response.status_code == 200:
+                    print(f"✅ {endpoint} working")
+                else:
+                    print(f"❌ {endpoint} failed: {response.status_code}")
         
         # Test reset
-        response = requests.post(f"{base_url}/api/config/reset", timeout=5)
+        response = SESSION.post(f"{base_url}/api/config/reset", timeout=5)
         if response.status_code == 200:
             print("✅ Reset endpoint working")
         else:
@@ -4,6 +4,7 @@ Test script to verify real estate knowledge base is working
 """
 
 import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from qa_engine import RealEstateQA
 from ai_services import AIServices
 
@@ -15,7 +16,6 @@ async def test_real_estate_responses():
         # Initialize services
         ai_services = AIServices()
         bot = RealEstateQA(ai_services)
-        history = []
         
         # Test questions
         test_questions = [
@@ -27,23 +27,18 @@ async def test_real_estate_responses():
             "What amenities do you offer?"
         ]
         
-        for question in test_questions:
+        # Each question is a standalone knowledge-base lookup, so all of them are
+        # asked at once on a dedicated pool (fresh history per call)
+        loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(max_workers=len(test_questions)) as executor:
+            replies = await asyncio.gather(*[
+                loop.run_in_executor(executor, bot.get_response, question, [])
+                for question in test_questions
+            ])
+        
+        for question, reply in zip(test_questions, replies):
             print(f"\n🤖 Question: {question}")
-            
-            reply = await asyncio.get_event_loop().run_in_executor(
-                None, 
-                bot.get_response, 
-                question, 
-                history
-            )
-            
             print(f"✅ Answer: {reply}")
-            
-            # Update history for context
-            history.extend([
-                {"role": "user", "content": question},
-                {"role": "assistant", "content": reply}
-            ])
         
         print("\n🎉 Real estate knowledge base is working correctly!")
         return True
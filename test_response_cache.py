@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Test script for the legacy voice bot's reply cache
+Checks which rephrasings may reuse a cached LLM reply and which must not
+"""
+
+import websocket_server as ws
+
+def reset_cache():
+    """Forget every cached reply"""
+    ws._cache_lru.clear()
+    ws._cache_ctx[:] = 0
+    ws._cache_replies[:] = [None] * ws.RESPONSE_CACHE_SIZE
+
+def remember(text: str, reply: str, history=None):
+    ws.cache_response(ws.embed_utterance(text), ws.history_context(history or [], text), reply)
+
+def lookup(text: str, history=None):
+    return ws.cached_response(ws.embed_utterance(text), ws.history_context(history or [], text))
+
+def test_same_question_reuses_reply():
+    """Case and punctuation differences still hit the cached reply"""
+    print("🧪 Testing a repeated question...")
+    reset_cache()
+    remember("is parking available in the project", "Yes, covered parking is included.")
+    assert lookup("Is parking available in the project?") == "Yes, covered parking is included."
+    assert lookup("IS PARKING AVAILABLE IN THE PROJECT") == "Yes, covered parking is included."
+    print("✅ The same question reuses the cached reply")
+
+def test_one_noun_substitution_misses():
+    """A long question that differs by one noun must not get the other question's answer"""
+    print("🧪 Testing one-noun substitution in a long question...")
+    reset_cache()
+    flat = "can you tell me the price of a 2BHK flat in Andheri east near the metro station with parking"
+    villa = "can you tell me the price of a 2BHK villa in Andheri east near the metro station with parking"
+    remember(flat, "A 2BHK flat in Andheri East starts at 95 lakh.")
+    assert lookup(flat) == "A 2BHK flat in Andheri East starts at 95 lakh."
+    assert lookup(villa) is None, "villa question reused the flat answer"
+    print("✅ One-noun substitution misses the cache")
+
+def test_numbers_and_negations_must_match():
+    """Digits, number words and negations change the answer"""
+    print("🧪 Testing numbers and negations...")
+    reset_cache()
+    remember("show me 2 BHK flats under 50 lakh", "We have 2 BHK flats from 45 lakh.")
+    remember("is parking available in the project", "Yes, covered parking is included.")
+    assert lookup("show me 3 BHK flats under 50 lakh") is None
+    assert lookup("show me 2 BHK flats under 60 lakh") is None
+    assert lookup("is parking not available in the project") is None
+    assert lookup("isn't parking available in the project") is None
+    print("✅ Numbers and negations must match exactly")
+
+def test_config_edit_invalidates():
+    """Replies cached before an agent_config edit are not reused after it"""
+    print("🧪 Testing agent config edits...")
+    reset_cache()
+    signature = ws.agent_config.file_signature
+    try:
+        ws.agent_config.file_signature = lambda: (1, 100)
+        remember("what amenities do you offer", "Pool, gym and clubhouse.")
+        assert lookup("what amenities do you offer") == "Pool, gym and clubhouse."
+        ws.agent_config.file_signature = lambda: (2, 120)
+        assert lookup("what amenities do you offer") is None
+    finally:
+        ws.agent_config.file_signature = signature
+    print("✅ Config edits invalidate cached replies")
+
+if __name__ == "__main__":
+    test_same_question_reuses_reply()
+    test_one_noun_substitution_misses()
+    test_numbers_and_negations_must_match()
+    test_config_edit_invalidates()
+    print("\n🎉 All response cache tests passed!")
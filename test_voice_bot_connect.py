@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Test script for the legacy voice bot's connection handler
+Checks that call context in the WebSocket URL reaches call tracking
+"""
+
+import asyncio
+import websockets
+from websockets.asyncio.client import connect
+import websocket_server as ws
+
+async def connect_with_query(query: str) -> dict:
+    """Open one call against the real handler and return what call tracking was started with"""
+    tracked = {}
+    start_call_tracking = ws.start_call_tracking
+
+    async def record(phone_number, lead_id=None, call_session_id=None):
+        tracked.update(phone_number=phone_number, lead_id=lead_id, call_session_id=call_session_id)
+        await start_call_tracking(phone_number, lead_id, call_session_id)
+
+    ws.start_call_tracking = record
+    ws.DG_WS_URL = "ws://127.0.0.1:9"  # No Deepgram here; the call stays up without it
+    try:
+        async with websockets.serve(ws.ultra_fast_client_handler, "127.0.0.1", 0) as server:
+            port = server.sockets[0].getsockname()[1]
+            async with connect(f"ws://127.0.0.1:{port}/{query}"):
+                for _ in range(100):
+                    if tracked:
+                        break
+                    await asyncio.sleep(0.01)
+    finally:
+        ws.start_call_tracking = start_call_tracking
+    return tracked
+
+def test_query_params_reach_call_tracking():
+    """session, phone_number and lead_id in the URL link the call to its record"""
+    print("🧪 Testing call context from the query string...")
+    tracked = asyncio.run(connect_with_query("?session=abc-123&phone_number=9876543210&lead_id=L42"))
+    assert tracked == {"phone_number": "9876543210", "lead_id": "L42", "call_session_id": "abc-123"}, tracked
+    print("✅ Query string context reaches call tracking")
+
+if __name__ == "__main__":
+    test_query_params_reach_call_tracking()
+    print("\n🎉 All connection tests passed!")
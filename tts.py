@@ -4,7 +4,11 @@ tts.py  –  Text-to-Speech helper for Piopiy calls
 • Returns raw 8 kHz μ-law bytes ready for Piopiy.
 """
 
-import os, json, aiohttp, asyncio
+import os, asyncio, hashlib, random, httpx, orjson
+from collections import OrderedDict
+from typing import AsyncIterator
+from agent_config import agent_config
+from utils import ulaw_to_pcm16
 
 DG_KEY = os.getenv("DG_API_KEY")
 if not DG_KEY:
@@ -14,16 +18,57 @@ if not DG_KEY:
 VOICE_MODEL = "aura-asteria-en"      # glossy female
 SAMPLE_RATE = 8000                   # matches Piopiy μ-law stream
 
-async def text_to_mulaw(text: str) -> bytes:
+URL = f"https://api.deepgram.com/v1/speak?model={VOICE_MODEL}"
+HEADERS = {"Authorization": f"Token {DG_KEY}", "Content-Type": "application/json"}
+
+# Voice-UX budget: a stuck Deepgram request fails fast instead of stalling the reply.
+# httpx bounds each phase (connect / each read), so with MAX_RETRIES the worst case is bounded too.
+TIMEOUT = httpx.Timeout(8.0, connect=3.0, read=6.0)
+
+# Shared HTTP/2 client: one TLS session, concurrent utterances multiplexed over it
+_CLIENT = httpx.AsyncClient(
+    http2=True,
+    timeout=TIMEOUT,
+    limits=httpx.Limits(max_connections=8, max_keepalive_connections=8, keepalive_expiry=60),
+)
+
+# LRU of synthesized audio: canned replies (greeting, exit, confirmations) repeat a lot
+TTS_CACHE_SIZE = 256
+_cache: OrderedDict[bytes, bytes] = OrderedDict()
+
+# Transient Deepgram failures are retried with jittered exponential backoff
+MAX_RETRIES = 4
+RETRY_STATUSES = (429, 502, 503, 504)
+
+def _backoff_delay(attempt: int, retry_after: str | None = None) -> float:
+    """100ms * 1.25^attempt with ±3% jitter, or the server's Retry-After; capped at 60s."""
+    if retry_after:
+        try:
+            return min(float(retry_after), 60.0)
+        except ValueError:
+            pass
+    delay = 0.1 * 1.25 ** attempt
+    return min(delay + random.uniform(-0.03, 0.03) * delay, 60.0)
+
+async def close_client():
+    """Close the shared client (call from the app's shutdown hook)."""
+    await _CLIENT.aclose()
+
+async def text_to_mulaw_stream(text: str, chunk_size: int = 1024) -> AsyncIterator[bytes]:
     """
-    Async → returns μ-law PCM bytes (8 kHz).
-    Raise RuntimeError on any non-200 response.
+    Async generator → yields μ-law PCM chunks (8 kHz) as Deepgram streams them,
+    so playback can start before synthesis finishes.
+    429/5xx and connection errors are retried; raise RuntimeError on any other non-200
+    response or once retries run out.
+    Repeated texts are served from an in-process LRU without a network call.
     """
-    url = f"https://api.deepgram.com/v1/speak?model={VOICE_MODEL}"
-    hdr = {
-        "Authorization": f"Token {DG_KEY}",
-        "Content-Type": "application/json"
-    }
+    key = hashlib.blake2b(text.encode(), digest_size=16).digest()
+    audio = _cache.get(key)
+    if audio is not None:
+        _cache.move_to_end(key)
+        yield audio
+        return
+
     body = {
         "text": text,
         "encoding": "mulaw",
@@ -31,9 +76,95 @@ async def text_to_mulaw(text: str) -> bytes:
         "utterance_id": "agent-reply"
     }
 
-    async with aiohttp.ClientSession() as ses:
-        async with ses.post(url, headers=hdr, data=json.dumps(body)) as resp:
-            if resp.status != 200:
-                raise RuntimeError(f"TTS error {resp.status}: "
-                                   f"{await resp.text()}")
-            return await resp.read()
+    buf = bytearray()
+    payload = orjson.dumps(body)
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            async with _CLIENT.stream("POST", URL, headers=HEADERS, content=payload) as resp:
+                if resp.status_code != 200:
+                    await resp.aread()
+                    if resp.status_code in RETRY_STATUSES and attempt < MAX_RETRIES:
+                        delay = _backoff_delay(attempt, resp.headers.get("Retry-After"))
+                        print(f"⚠️ TTS HTTP {resp.status_code}, retrying in {delay:.2f}s ({attempt + 1}/{MAX_RETRIES})")
+                        await asyncio.sleep(delay)
+                        continue
+                    raise RuntimeError(f"TTS error {resp.status_code}: {resp.text}")
+                async for chunk in resp.aiter_bytes(chunk_size):
+                    buf += chunk
+                    yield chunk
+            break
+        except httpx.TransportError as e:
+            # Audio already handed to the caller cannot be replayed, so only retry before the first chunk
+            if buf or attempt >= MAX_RETRIES:
+                raise RuntimeError(f"TTS request failed: {e}") from e
+            delay = _backoff_delay(attempt)
+            print(f"⚠️ TTS connection error: {e}, retrying in {delay:.2f}s ({attempt + 1}/{MAX_RETRIES})")
+            await asyncio.sleep(delay)
+
+    # Only a fully received utterance is cached
+    _cache[key] = bytes(buf)
+    if len(_cache) > TTS_CACHE_SIZE:
+        _cache.popitem(last=False)
+
+async def text_to_mulaw(text: str) -> bytes:
+    """
+    Async → returns μ-law PCM bytes (8 kHz) as one blob.
+    Raise RuntimeError on any non-200 response.
+    """
+    audio = bytearray()
+    async for chunk in text_to_mulaw_stream(text, chunk_size=8192):
+        audio += chunk
+    return bytes(audio)
+
+
+# Greeting/exit audio in this module's Deepgram voice, for callers that speak with it:
+# run watch_preroll as a task to synthesize it ahead of the first call and again whenever
+# the agent_config file changes. A text that still misses is synthesized on use.
+PREROLL: dict[str, tuple[str, bytes]] = {}
+_preroll_pcm: dict[str, bytes] = {}  # Same audio as 8 kHz 16-bit PCM, keyed by text; decoded once per warm
+PREROLL_WATCH_S = 2.0  # How often watch_preroll stats the config file
+
+async def _preroll(name: str, text: str) -> bytes:
+    cached = PREROLL.get(name)
+    if cached and cached[0] == text:
+        return cached[1]
+    audio = await text_to_mulaw(text)
+    if cached:
+        _preroll_pcm.pop(cached[0], None)
+    PREROLL[name] = (text, audio)
+    _preroll_pcm[text] = ulaw_to_pcm16(audio)
+    return audio
+
+async def get_greeting_mulaw() -> bytes:
+    """μ-law audio for the configured greeting, synthesized once per text."""
+    return await _preroll("greeting", agent_config.get_greeting_message())
+
+async def get_exit_mulaw() -> bytes:
+    """μ-law audio for the configured exit message, synthesized once per text."""
+    return await _preroll("exit", agent_config.get_exit_message())
+
+async def warm_preroll():
+    """Synthesize greeting and exit audio at startup (call from the app's startup hook)."""
+    try:
+        await asyncio.gather(get_greeting_mulaw(), get_exit_mulaw())
+        print(f"🎵 TTS preroll ready: {', '.join(PREROLL)}")
+    except Exception as e:
+        print(f"⚠️ TTS preroll failed: {e}")
+
+async def watch_preroll(interval: float = PREROLL_WATCH_S):
+    """Warm the preroll, then re-warm it whenever agent_config's file signature changes (run as a task)."""
+    signature = agent_config.file_signature()
+    await warm_preroll()
+    while True:
+        await asyncio.sleep(interval)
+        current = agent_config.file_signature()
+        if current != signature:
+            signature = current
+            await warm_preroll()
+
+def preroll_pcm16(text: str) -> bytes | None:
+    """
+    Pre-synthesized audio for text if it is the current greeting or exit message,
+    as 8 kHz 16-bit PCM (Piopiy's "raw" stream format); None otherwise.
+    """
+    return _preroll_pcm.get(text)
@@ -1,12 +1,116 @@
 # utils.py
-import audioop
+import numpy as np
+from functools import lru_cache
+from math import gcd
+from scipy.signal import firwin, resample_poly
+
+
+def _build_ulaw_lut() -> np.ndarray:
+    """
+    G.711 μ-law encoding of every int16 sample, indexed by the sample's uint16 bit pattern.
+    Same table audioop.lin2ulaw uses (14-bit magnitude, bias 33, clip 8159).
+    """
+    pcm = np.arange(-32768, 32768, dtype=np.int32) >> 2
+    mask = np.where(pcm < 0, 0x7F, 0xFF)
+    mag = np.minimum(np.abs(pcm), 8159) + 33
+    seg = np.searchsorted(np.array([0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF, 0x1FFF]), mag)
+    uval = np.where(seg >= 8, 0x7F, (seg << 4) | ((mag >> (seg + 1)) & 0xF))
+    lut = np.empty(65536, dtype=np.uint8)
+    lut[np.arange(-32768, 32768, dtype=np.int16).view(np.uint16)] = (uval ^ mask).astype(np.uint8)
+    return lut
+
+ULAW_LUT = _build_ulaw_lut()
+
+
+def _build_ulaw_decode_lut() -> np.ndarray:
+    """G.711 μ-law byte -> int16 sample, as audioop.ulaw2lin decodes it."""
+    u = ~np.arange(256, dtype=np.int32) & 0xFF
+    mag = ((((u & 0x0F) << 3) + 0x84) << ((u >> 4) & 0x07)) - 0x84
+    return np.where(u & 0x80, -mag, mag).astype(np.int16)
+
+ULAW_DECODE_LUT = _build_ulaw_decode_lut()
+
+
+def ulaw_to_pcm16(ulaw: bytes) -> bytes:
+    """
+    Expands 8 kHz μ-law (1-byte samples) to 16-bit little-endian PCM at the same rate.
+    """
+    return ULAW_DECODE_LUT[np.frombuffer(ulaw, dtype=np.uint8)].astype("<i2").tobytes()
+
 
 def pcm16_to_ulaw_8000(raw_linear16: bytes, in_rate: int) -> bytes:
     """
     Down-samples 16-bit little-endian PCM to 8 kHz μ-law (1-byte samples).
     """
+    samples = np.frombuffer(raw_linear16, dtype="<i2")
     if in_rate != 8_000:
-        raw_linear16, _ = audioop.ratecv(
-            raw_linear16, 2, 1, in_rate, 8_000, None
-        )
-    return audioop.lin2ulaw(raw_linear16, 2)
+        g = gcd(8_000, in_rate)
+        samples = resample_poly(samples, 8_000 // g, in_rate // g)
+        samples = np.clip(np.rint(samples), -32768, 32767).astype(np.int16)
+    return ULAW_LUT[samples.view(np.uint16)].tobytes()
+
+
+@lru_cache(maxsize=8)
+def _polyphase_filter(in_rate: int):
+    """
+    The low-pass resample_poly designs for in_rate -> 8 kHz, in polyphase layout.
+    Returns (up, down, half_len, phases); phases row p holds taps p, p+up, p+2up, ...
+    reversed, to dot against input samples in time order.
+    """
+    g = gcd(8_000, in_rate)
+    up, down = 8_000 // g, in_rate // g
+    max_rate = max(up, down)
+    taps = firwin(2 * 10 * max_rate + 1, 1.0 / max_rate, window=("kaiser", 5.0)) * up
+    phase_len = -(-len(taps) // up)
+    padded = np.zeros(phase_len * up)
+    padded[:len(taps)] = taps
+    return up, down, (len(taps) - 1) // 2, padded.reshape(phase_len, up).T[:, ::-1].copy()
+
+
+def pcm16_to_ulaw_8000_stream(raw_linear16: bytes, in_rate: int, state=None, final: bool = False):
+    """
+    Chunked variant of pcm16_to_ulaw_8000 for streamed audio: the same resample_poly
+    filter, evaluated as samples arrive. Returns (ulaw_bytes, state); pass state back
+    in with the next chunk, and final=True with the last one to flush the filter tail.
+    The concatenated output is byte-identical to pcm16_to_ulaw_8000 on the whole stream.
+    """
+    if in_rate == 8_000:
+        # No resampling; state is just an odd trailing byte waiting for its other half
+        data = (state or b"") + raw_linear16
+        usable = len(data) & ~1
+        return ULAW_LUT[np.frombuffer(data[:usable], dtype="<i2").view(np.uint16)].tobytes(), data[usable:]
+
+    up, down, half_len, phases = _polyphase_filter(in_rate)
+    phase_len = phases.shape[1]
+    if state is None:
+        # Before the stream is silence: phase_len - 1 zeros, indexed from below 0
+        state = (np.zeros(phase_len - 1), 1 - phase_len, 0, 0, b"")
+    buf, base, m_next, n_in, carry = state
+
+    data = carry + raw_linear16
+    usable = len(data) & ~1  # an odd trailing byte waits for its other half
+    carry = data[usable:]
+    buf = np.concatenate((buf, np.frombuffer(data[:usable], dtype="<i2")))
+    n_in += usable // 2
+
+    if final:
+        # Same output length as resample_poly; the stream is followed by silence
+        m_end = -(-n_in * up // down)
+        needed = ((m_end - 1) * down + half_len) // up + 1 - base
+        if needed > len(buf):
+            buf = np.concatenate((buf, np.zeros(needed - len(buf))))
+    else:
+        # Every output whose newest input sample has arrived
+        m_end = (n_in * up - 1 - half_len) // down + 1
+    if m_end <= m_next:
+        return b"", (buf, base, m_next, n_in, carry)
+
+    n = np.arange(m_next, m_end) * down + half_len
+    windows = np.lib.stride_tricks.sliding_window_view(buf, phase_len)
+    out = np.einsum("ij,ij->i", windows[n // up - (phase_len - 1) - base], phases[n % up])
+    out = np.clip(np.rint(out), -32768, 32767).astype(np.int16)
+
+    # Drop samples no later output can reach
+    keep_from = (m_end * down + half_len) // up - (phase_len - 1) - base
+    keep_from = min(max(keep_from, 0), len(buf))
+    return ULAW_LUT[out.view(np.uint16)].tobytes(), (buf[keep_from:], base + keep_from, m_end, n_in, carry)
@@ -5,46 +5,73 @@ ULTRA-FAST Voice Bot - Simple Logging
 • Shows Groq replies
 • Maximum speed optimization
 """
-import asyncio, base64, json, os, threading, time
-from queue import SimpleQueue
+import asyncio, base64, binascii, os, re, zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import Context, ContextVar
+from dataclasses import dataclass, field
+from typing import AsyncIterator
 import numpy as np
 import scipy.signal as sps
 import httpx
+import orjson
 from datetime import datetime
 
 import websockets
-import websocket
+from websockets.asyncio.client import connect as ws_connect
+
+# uvloop ships with uvicorn[standard] on Linux; fall back to asyncio elsewhere (e.g. Windows)
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
 from piopiy import StreamAction
 
 # ─── Project helpers ────────────────────────────────────────────────────────
 from qa_engine import RealEstateQA
 from ai_services import AIServices
+from config import WEBSOCKET_PORT
+from agent_config import agent_config
 
 # Call logging and tracking
 from mongo_client import mongo_client
-from calls_api import log_call
+from routers.calls_api import log_call, update_lead_status_from_call
 import httpx
 
-# Global call tracking
-current_call_data = {
-    "phone_number": None,
-    "lead_id": None,
-    "transcription": [],
-    "ai_responses": [],
-    "start_time": None,
-    "end_time": None
-}
+# Per-connection call state
+@dataclass(slots=True)
+class CallState:
+    """Tracking data, queues and sockets owned by one Piopiy connection (see current_call)."""
+    phone_number: str | None = None
+    lead_id: str | None = None
+    transcription: list = field(default_factory=list)
+    ai_responses: list = field(default_factory=list)
+    start_time: datetime | None = None
+    end_time: datetime | None = None
+    call_session_id: str | None = None
+    client_ws: object = None  # Piopiy connection
+    out_q: asyncio.Queue = field(default_factory=asyncio.Queue)  # Outbound messages, sent by piopiy_writer
+    transcript_q: asyncio.Queue = field(default_factory=asyncio.Queue)  # Final transcripts for the LLM worker
+    tts_q: asyncio.Queue = field(default_factory=asyncio.Queue)
+    dg_ws: object = None  # This call's Deepgram stream, once connected
+    dg_ready: asyncio.Event = field(default_factory=asyncio.Event)  # Set once Deepgram connects (or fails to)
+
+# Set by ultra_fast_client_handler; the call's worker tasks inherit the same CallState
+current_call: ContextVar[CallState] = ContextVar("current_call")
+_finalization_q: asyncio.Queue = asyncio.Queue()  # Finished calls awaiting interest analysis + MongoDB write
+_finalizer_task: asyncio.Task | None = None
 
 async def log_call_message(message_type, content, phone_number=None, lead_id=None):
     """Log call message and track conversation"""
     try:
+        call = current_call.get()
         # Print to terminal for immediate feedback
         timestamp = datetime.now().strftime("%H:%M:%S")
 
         if message_type == "user":
             print(f" [{timestamp}] User: {content}")
             # Add to transcription
-            current_call_data["transcription"].append({
+            call.transcription.append({
                 "type": "user",
                 "content": content,
                 "timestamp": datetime.now().isoformat()
@@ -52,7 +79,7 @@ async def log_call_message(message_type, content, phone_number=None, lead_id=Non
         elif message_type == "bot":
             print(f"[{timestamp}] Bot: {content}")
             # Add to AI responses
-            current_call_data["ai_responses"].append({
+            call.ai_responses.append({
                 "type": "bot",
                 "content": content,
                 "timestamp": datetime.now().isoformat()
@@ -60,7 +87,7 @@ async def log_call_message(message_type, content, phone_number=None, lead_id=Non
         elif message_type == "greeting":
             print(f"[{timestamp}] Greeting: {content}")
             # Add to AI responses
-            current_call_data["ai_responses"].append({
+            call.ai_responses.append({
                 "type": "greeting",
                 "content": content,
                 "timestamp": datetime.now().isoformat()
@@ -68,7 +95,7 @@ async def log_call_message(message_type, content, phone_number=None, lead_id=Non
         elif message_type == "exit":
             print(f" [{timestamp}] Exit: {content}")
             # Add to AI responses
-            current_call_data["ai_responses"].append({
+            call.ai_responses.append({
                 "type": "exit",
                 "content": content,
                 "timestamp": datetime.now().isoformat()
@@ -78,63 +105,146 @@ async def log_call_message(message_type, content, phone_number=None, lead_id=Non
 
         # Update call data
         if phone_number:
-            current_call_data["phone_number"] = phone_number
+            call.phone_number = phone_number
         if lead_id:
-            current_call_data["lead_id"] = lead_id
+            call.lead_id = lead_id
 
     except Exception as e:
         print(f" Call logging error: {e}")
 
 async def start_call_tracking(phone_number, lead_id=None, call_session_id: str | None = None):
     """Start tracking a new call"""
-    global current_call_data
-    current_call_data = {
-        "phone_number": phone_number,
-        "lead_id": lead_id,
-        "transcription": [],
-        "ai_responses": [],
-        "start_time": datetime.now(),
-        "end_time": None,
-        "call_session_id": call_session_id or None
-    }
+    call = current_call.get()
+    call.phone_number = phone_number
+    call.lead_id = lead_id
+    call.transcription = []
+    call.ai_responses = []
+    call.start_time = datetime.now()
+    call.end_time = None
+    call.call_session_id = call_session_id or None
     print(f" Started tracking call for {phone_number}")
 
+def save_call_record(phone_to_log, lead_id, call_session_id, call_data):
+    """Write a finished call to MongoDB: complete its initiated record, or log a new one"""
+    # Try to update existing call record if we have meaningful conversation data
+    if call_data["transcription"] or call_data["ai_responses"]:
+        # First, try to update via session_id if we have it
+        if call_session_id:
+            result = log_call(phone_to_log, lead_id, call_data)
+            if result["success"]:
+                print(f" Call logged to MongoDB: {phone_to_log} (session: {call_session_id})")
+                if result.get("note") == "updated_existing_by_session":
+                    print(" Updated existing call record via session_id")
+            else:
+                print(f"Failed to log call: {result.get('error', 'Unknown error')}")
+
+        # If no session_id, try to find and update recent "initiated" call by phone number or lead_id
+        elif phone_to_log != "unknown" and mongo_client and mongo_client.is_connected():
+            try:
+                from datetime import timedelta
+                five_minutes_ago = datetime.now() - timedelta(minutes=5)
+
+                # Build query to find recent initiated call
+                query = {
+                    "status": "initiated",
+                    "created_at": {"$gte": five_minutes_ago}
+                }
+
+                # Prefer matching by lead_id if available, otherwise by phone
+                if lead_id:
+                    query["lead_id"] = lead_id
+                else:
+                    query["phone_number"] = phone_to_log
+
+                # Find the newest match and complete it in the same round trip
+                recent_call = mongo_client.calls.find_one_and_update(
+                    query,
+                    {"$set": {
+                        "status": "completed",
+                        "duration": call_data["duration"],
+                        "transcription": call_data["transcription"],
+                        "ai_responses": call_data["ai_responses"],
+                        "call_summary": call_data["summary"],
+                        "sentiment": call_data["sentiment"],
+                        "interest_analysis": call_data["interest_analysis"],
+                        "updated_at": datetime.now()
+                    }},
+                    sort=[("created_at", -1)],
+                    projection={"_id": 1}
+                )
+
+                if recent_call:
+                    print(f"Updated existing initiated call record for {phone_to_log or lead_id}")
+
+                    # Update lead status based on the completed call
+                    update_lead_status_from_call(phone_to_log, lead_id, call_data)
+                else:
+                    # No recent initiated call found, create new record
+                    result = log_call(phone_to_log, lead_id, call_data)
+                    print(f" Created new call record for {phone_to_log}")
+            except Exception as e:
+                print(f"Error updating existing call: {e}")
+                # Fallback to creating new record
+                result = log_call(phone_to_log, lead_id, call_data)
+
+        # Fallback: create new record if we have conversation data but no way to link
+        else:
+            result = log_call(phone_to_log, lead_id, call_data)
+            print(f"Created fallback call record")
+    else:
+        print(" Skipping log - no conversation data to save")
+
 async def end_call_tracking():
-    """End call tracking and save to MongoDB"""
-    global current_call_data
+    """End call tracking and hand the call to the background finalizer for saving"""
+    global _finalizer_task
+    call = current_call.get()
 
     # Only proceed if we have meaningful conversation data or proper context
-    if not current_call_data["phone_number"] and not current_call_data["transcription"] and not current_call_data["ai_responses"]:
+    if not call.phone_number and not call.transcription and not call.ai_responses:
         print(" No meaningful call data to save")
         return
 
     # Skip logging if this is just an "unknown" phone with no conversation
-    if current_call_data["phone_number"] == "unknown" and not current_call_data["transcription"] and not current_call_data["ai_responses"]:
+    if call.phone_number == "unknown" and not call.transcription and not call.ai_responses:
         print(" Skipping log for unknown phone with no conversation")
         return
 
-    try:
-        current_call_data["end_time"] = datetime.now()
+    call.end_time = datetime.now()
+    _finalization_q.put_nowait(call)
+    if _finalizer_task is None or _finalizer_task.done():
+        # Outlives this connection, so don't let it inherit the call's context
+        _finalizer_task = asyncio.create_task(call_finalizer_worker(), context=Context())
+
+async def call_finalizer_worker():
+    """Finalize ended calls one at a time, after their connections have closed"""
+    while True:
+        call = await _finalization_q.get()
+        try:
+            await finalize_call(call)
+        finally:
+            _finalization_q.task_done()
 
+async def finalize_call(call: CallState):
+    """Run interest analysis for a finished call and save it to MongoDB"""
+    try:
         # Calculate duration
         duration = 0
-        if current_call_data["start_time"] and current_call_data["end_time"]:
-            duration = (current_call_data["end_time"] - current_call_data["start_time"]).total_seconds()
+        if call.start_time and call.end_time:
+            duration = (call.end_time - call.start_time).total_seconds()
 
         # Use actual phone number if available, otherwise keep as "unknown"
-        phone_to_log = current_call_data["phone_number"] or "unknown"
+        phone_to_log = call.phone_number or "unknown"
 
         # Analyze conversation interest using LLM
         interest_analysis = None
-        if current_call_data["transcription"] and current_call_data["ai_responses"]:
+        if call.transcription and call.ai_responses:
             try:
                 print(" Starting interest analysis...")
-                # Create a temporary QA instance for analysis
-                from qa_engine import RealEstateQA
-                bot = RealEstateQA(ai_services)
-                interest_analysis = bot.analyze_conversation_interest(
-                    current_call_data["transcription"],
-                    current_call_data["ai_responses"]
+                # Blocking LLM call; keep it off the loop so other calls keep streaming
+                interest_analysis = await asyncio.get_running_loop().run_in_executor(
+                    LLM_POOL, qa_bot.analyze_conversation_interest,
+                    call.transcription,
+                    call.ai_responses
                 )
                 print(f"Interest analysis completed: {interest_analysis['interest_status']} ({interest_analysis['confidence']:.2f})")
             except Exception as e:
@@ -150,95 +260,23 @@ async def end_call_tracking():
         # Prepare call data for MongoDB
         call_data = {
             "duration": duration,
-            "transcription": current_call_data["transcription"],
-            "ai_responses": current_call_data["ai_responses"],
-            "summary": f"Call with {len(current_call_data['transcription'])} user messages and {len(current_call_data['ai_responses'])} AI responses",
+            "transcription": call.transcription,
+            "ai_responses": call.ai_responses,
+            "summary": f"Call with {len(call.transcription)} user messages and {len(call.ai_responses)} AI responses",
             "sentiment": "neutral",  # Could be enhanced with sentiment analysis
             "interest_analysis": interest_analysis,  # Add interest analysis
-            "call_session_id": current_call_data.get("call_session_id"),
+            "call_session_id": call.call_session_id,
             "status": "completed"  # Mark as completed
         }
 
-        # Try to update existing call record if we have meaningful conversation data
-        if current_call_data["transcription"] or current_call_data["ai_responses"]:
-            # First, try to update via session_id if we have it
-            if current_call_data.get("call_session_id"):
-                result = log_call(phone_to_log, current_call_data["lead_id"], call_data)
-                if result["success"]:
-                    print(f" Call logged to MongoDB: {phone_to_log} (session: {current_call_data.get('call_session_id')})")
-                    if result.get("note") == "updated_existing_by_session":
-                        print(" Updated existing call record via session_id")
-                else:
-                    print(f"Failed to log call: {result.get('error', 'Unknown error')}")
-
-            # If no session_id, try to find and update recent "initiated" call by phone number or lead_id
-            elif phone_to_log != "unknown" and mongo_client and mongo_client.is_connected():
-                try:
-                    from datetime import timedelta
-                    five_minutes_ago = datetime.now() - timedelta(minutes=5)
-
-                    # Build query to find recent initiated call
-                    query = {
-                        "status": "initiated",
-                        "created_at": {"$gte": five_minutes_ago}
-                    }
-
-                    # Prefer matching by lead_id if available, otherwise by phone
-                    if current_call_data["lead_id"]:
-                        query["lead_id"] = current_call_data["lead_id"]
-                    else:
-                        query["phone_number"] = phone_to_log
-
-                    recent_call = mongo_client.calls.find_one(query, sort=[("created_at", -1)])
-
-                    if recent_call:
-                        # Update the existing initiated call record
-                        mongo_client.calls.update_one(
-                            {"_id": recent_call["_id"]},
-                            {"$set": {
-                                "status": "completed",
-                                "duration": call_data["duration"],
-                                "transcription": call_data["transcription"],
-                                "ai_responses": call_data["ai_responses"],
-                                "call_summary": call_data["summary"],
-                                "sentiment": call_data["sentiment"],
-                                "interest_analysis": call_data["interest_analysis"],
-                                "updated_at": datetime.now()
-                            }}
-                        )
-                        print(f"Updated existing initiated call record for {phone_to_log or current_call_data['lead_id']}")
-
-                        # Update lead status based on the completed call
-                        from calls_api import update_lead_status_from_call
-                        update_lead_status_from_call(phone_to_log, current_call_data["lead_id"], call_data)
-                    else:
-                        # No recent initiated call found, create new record
-                        result = log_call(phone_to_log, current_call_data["lead_id"], call_data)
-                        print(f" Created new call record for {phone_to_log}")
-                except Exception as e:
-                    print(f"Error updating existing call: {e}")
-                    # Fallback to creating new record
-                    result = log_call(phone_to_log, current_call_data["lead_id"], call_data)
-
-            # Fallback: create new record if we have conversation data but no way to link
-            else:
-                result = log_call(phone_to_log, current_call_data["lead_id"], call_data)
-                print(f"Created fallback call record")
-        else:
-            print(" Skipping log - no conversation data to save")
+        # Blocking PyMongo work runs on IO_POOL so call teardown never stalls the loop
+        await asyncio.get_running_loop().run_in_executor(
+            IO_POOL, save_call_record,
+            phone_to_log, call.lead_id, call.call_session_id, call_data
+        )
 
     except Exception as e:
-        print(f"Error ending call tracking: {e}")
-
-    # Reset call data
-    current_call_data = {
-        "phone_number": None,
-        "lead_id": None,
-        "transcription": [],
-        "ai_responses": [],
-        "start_time": None,
-        "end_time": None
-    }
+        print(f"Error finalizing call: {e}")
 
 print("Call tracking enabled with MongoDB")
 
@@ -256,12 +294,22 @@ DG_WS_URL = (
     "&language=en-IN&smart_format=true&vad_turnoff=1500"
 )
 
+# Shared HTTP/2 client: the TLS handshake to Google TTS is paid once, not per reply
+TTS_CLIENT = httpx.AsyncClient(
+    http2=True,
+    timeout=10,
+    limits=httpx.Limits(max_keepalive_connections=4, keepalive_expiry=300),
+)
+
 # ─── Globals ────────────────────────────────────────────────────────────────
-transcript_q = SimpleQueue()
-tts_q = SimpleQueue()
 ai_services = AIServices()
-dg_ws_client = None
-piopiy_ws = None
+qa_bot = RealEstateQA(ai_services)  # Stateless; shared by the LLM worker and end_call_tracking
+# Separate pools so a slow LLM call never queues ahead of audio resampling (or vice versa)
+DSP_POOL = ThreadPoolExecutor(max_workers=os.cpu_count() or 4, thread_name_prefix="dsp")
+LLM_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="llm")
+IO_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="mongo")
+PIOPIY_SEND_BATCH = 8
+TTS_SCRATCH_SAMPLES = 1 << 16  # 8 kHz samples per converted TTS chunk before falling back to a fresh buffer
 current_call_id = None  # Store current call ID for hangup
 
 async def trigger_call_hangup():
@@ -271,10 +319,10 @@ async def trigger_call_hangup():
 
         # For streaming calls, we need to close the WebSocket connection
         # This will cause Piopiy to hang up the call
-        global piopiy_ws
-        if piopiy_ws:
+        client_ws = current_call.get().client_ws
+        if client_ws:
             print("Closing WebSocket connection to hangup call")
-            await piopiy_ws.close()
+            await client_ws.close()
             await log_call_message("system", "WebSocket connection closed - call should end")
         else:
             print(" No active WebSocket connection to close")
@@ -286,255 +334,514 @@ async def trigger_call_hangup():
 
 # ─── Audio processing ───────────────────────────────────────────────────────
 
-def fast_audio_convert(raw_audio: bytes) -> bytes:
-    """Fastest possible audio conversion."""
-    samples = np.frombuffer(raw_audio, dtype=np.int16)
-    resampled = sps.resample_poly(samples, 8000, 22050)
-    normalized = np.clip(resampled * 0.8, -32767, 32767).astype(np.int16)
-    return normalized.tobytes()
+# 22050 Hz -> 8000 Hz is up 160 / down 441. This is the low-pass resample_poly would
+# design, built once here with the 0.8 output gain folded into the taps.
+RESAMPLE_UP, RESAMPLE_DOWN = 160, 441
+RESAMPLE_TAPS = 0.8 * sps.firwin(2 * 10 * RESAMPLE_DOWN + 1, 1.0 / RESAMPLE_DOWN, window=("kaiser", 5.0))
+
+# Polyphase layout of the same filter (scaled by up, as resample_poly does): output m
+# is one phase row dotted with the newest input samples, so audio can be converted as
+# it arrives with the same result as resampling the whole buffer.
+RESAMPLE_HALF_LEN = (len(RESAMPLE_TAPS) - 1) // 2
+RESAMPLE_PHASE_LEN = -(-len(RESAMPLE_TAPS) // RESAMPLE_UP)
+_phase_taps = np.zeros(RESAMPLE_PHASE_LEN * RESAMPLE_UP)
+_phase_taps[:len(RESAMPLE_TAPS)] = RESAMPLE_TAPS * RESAMPLE_UP
+# Row p = taps p, p+up, p+2up, ... reversed, to dot against samples in time order
+RESAMPLE_PHASES = _phase_taps.reshape(RESAMPLE_PHASE_LEN, RESAMPLE_UP).T[:, ::-1].copy()
+
+def stream_audio_convert(raw_chunk: bytes, state=None, final: bool = False, out_buf: np.ndarray | None = None):
+    """
+    Chunked 22050 Hz -> 8 kHz conversion. Returns (pcm, state); pass state back
+    with the next chunk, and final=True with the last one to flush the filter tail.
+    With out_buf (int16 scratch) pcm is a byte memoryview into it, valid until the
+    next call; otherwise it is bytes.
+    """
+    if state is None:
+        # Before the stream is silence: RESAMPLE_PHASE_LEN - 1 zeros, indexed from below 0
+        state = (np.zeros(RESAMPLE_PHASE_LEN - 1), 1 - RESAMPLE_PHASE_LEN, 0, 0, b"")
+    buf, base, m_next, n_in, carry = state
+
+    data = carry + raw_chunk
+    usable = len(data) & ~1  # an odd trailing byte waits for its other half
+    carry = data[usable:]
+    samples = np.frombuffer(data[:usable], dtype=np.int16)
+    buf = np.concatenate((buf, samples))
+    n_in += len(samples)
+
+    if final:
+        # Same output length as resample_poly; the stream is followed by silence
+        m_end = -(-n_in * RESAMPLE_UP // RESAMPLE_DOWN)
+        needed = ((m_end - 1) * RESAMPLE_DOWN + RESAMPLE_HALF_LEN) // RESAMPLE_UP + 1 - base
+        if needed > len(buf):
+            buf = np.concatenate((buf, np.zeros(needed - len(buf))))
+    else:
+        # Every output whose newest input sample has arrived
+        m_end = (n_in * RESAMPLE_UP - 1 - RESAMPLE_HALF_LEN) // RESAMPLE_DOWN + 1
+    if m_end <= m_next:
+        return b"", (buf, base, m_next, n_in, carry)
+
+    n = np.arange(m_next, m_end) * RESAMPLE_DOWN + RESAMPLE_HALF_LEN
+    windows = np.lib.stride_tricks.sliding_window_view(buf, RESAMPLE_PHASE_LEN)
+    out = np.einsum("ij,ij->i", windows[n // RESAMPLE_UP - (RESAMPLE_PHASE_LEN - 1) - base], RESAMPLE_PHASES[n % RESAMPLE_UP])
+    np.clip(out, -32767, 32767, out=out)
+
+    # Drop samples no later output can reach
+    keep_from = (m_end * RESAMPLE_DOWN + RESAMPLE_HALF_LEN) // RESAMPLE_UP - (RESAMPLE_PHASE_LEN - 1) - base
+    keep_from = min(max(keep_from, 0), len(buf))
+    state = (buf[keep_from:], base + keep_from, m_end, n_in, carry)
+    if out_buf is not None and len(out_buf) >= len(out):
+        pcm = out_buf[:len(out)]
+        np.copyto(pcm, out, casting="unsafe")  # Same truncating cast as astype, no new array
+        return memoryview(pcm).cast("B"), state
+    return out.astype(np.int16).tobytes(), state
 
 # ─── TTS ────────────────────────────────────────────────────────────────────
 
-async def ultra_fast_tts(text: str) -> bytes | None:
-    """Ultra-fast async TTS."""
+# Start of the base64 audio in Google's JSON reply; it is decoded as the body streams in
+TTS_AUDIO_START = re.compile(rb'"audioContent"\s*:\s*"')
+# Request body with everything but the text serialized once; %s takes the JSON-encoded text
+TTS_BODY_TEMPLATE = (
+    b'{"input":{"text":%s},'
+    b'"voice":{"languageCode":"en-US","name":"en-US-Standard-D","ssmlGender":"MALE"},'
+    b'"audioConfig":{"audioEncoding":"LINEAR16","sampleRateHertz":22050,"speakingRate":1.15}}'
+)
+TTS_HEADERS = {"Content-Type": "application/json"}
+
+async def ultra_fast_tts_stream(text: str) -> AsyncIterator[bytes]:
+    """Ultra-fast async TTS, yielding 22050 Hz PCM chunks while the response downloads."""
     if not text.strip():
         print("TTS skipped: empty text")
-        return None
+        return
     print(f"TTS request: '{text[:80]}'")
 
-    async with httpx.AsyncClient(timeout=10) as client:
-        try:
-            response = await client.post(GOOGLE_TTS_URL, json={
-                "input": {"text": text},
-                "voice": {"languageCode": "en-US", "name": "en-US-Standard-D", "ssmlGender": "MALE"},
-                "audioConfig": {"audioEncoding": "LINEAR16", "sampleRateHertz": 22050, "speakingRate": 1.15}
-            })
-            if response.status_code == 200:
-                audio_b64 = response.json().get("audioContent", "")
-                if not audio_b64:
-                    print("TTS success but empty audioContent")
-                    return None
-                raw = base64.b64decode(audio_b64)
-                print(f"TTS HTTP 200, bytes: {len(raw)}")
-                return raw
-            else:
+    try:
+        body = TTS_BODY_TEMPLATE % orjson.dumps(text)
+        async with TTS_CLIENT.stream("POST", GOOGLE_TTS_URL, content=body, headers=TTS_HEADERS) as response:
+            if response.status_code != 200:
                 try:
-                    body = response.text[:200]
+                    body = (await response.aread())[:200].decode(errors="replace")
                 except Exception:
                     body = "<unreadable body>"
                 print(f"TTS HTTP {response.status_code}: {body}")
-        except Exception as e:
-            print(f"TTS request failed: {e}")
-    return None
+                return
+
+            head = b""     # Body read so far, until the audioContent value starts
+            pending = b""  # base64 tail not yet a multiple of 4 chars
+            in_audio = False
+            total = 0
+            async for chunk in response.aiter_bytes():
+                if not in_audio:
+                    head += chunk
+                    match = TTS_AUDIO_START.search(head)
+                    if not match:
+                        continue
+                    chunk, head, in_audio = head[match.end():], b"", True
+                end = chunk.find(b'"')
+                pending += chunk if end < 0 else chunk[:end]
+                usable = len(pending) if end >= 0 else len(pending) - len(pending) % 4
+                if usable:
+                    raw = base64.b64decode(pending[:usable])
+                    pending = pending[usable:]
+                    total += len(raw)
+                    yield raw
+                if end >= 0:
+                    break
+
+            if total:
+                print(f"TTS HTTP 200, bytes: {total}")
+            else:
+                print("TTS success but empty audioContent")
+    except Exception as e:
+        print(f"TTS request failed: {e}")
+
+def _play_stream_envelope():
+    """
+    Split one StreamAction.playStream frame around its audio, so each chunk's frame is
+    a string concat. None (build every frame with StreamAction) if the shape is unexpected.
+    """
+    marker = "UExBWVNUUkVBTQ=="  # Valid base64, so playStream accepts it
+    try:
+        frame = StreamAction().playStream(audio_base64=marker, audio_type="raw", sample_rate=8000)
+    except Exception as e:
+        print(f"playStream template unavailable: {e}")
+        return None
+    if not isinstance(frame, str) or frame.count(marker) != 1:
+        return None
+    prefix, suffix = frame.split(marker)
+    return prefix, suffix
+
+PLAY_STREAM_ENVELOPE = _play_stream_envelope()
 
 async def send_audio_ultra_fast(audio_b64: str):
-    """Ultra-fast audio sending."""
-    global piopiy_ws
-    if piopiy_ws:
-        try:
+    """Ultra-fast audio sending (queued for the connection's writer task)."""
+    call = current_call.get()
+    if call.client_ws:
+        if PLAY_STREAM_ENVELOPE:
+            prefix, suffix = PLAY_STREAM_ENVELOPE
+            call.out_q.put_nowait(prefix + audio_b64 + suffix)
+        else:
             action = StreamAction()
-            await piopiy_ws.send(action.playStream(audio_base64=audio_b64, audio_type="raw", sample_rate=8000))
-            print(f"Sent audio chunk, length={len(audio_b64)} base64 chars")
+            call.out_q.put_nowait(action.playStream(audio_base64=audio_b64, audio_type="raw", sample_rate=8000))
+        print(f"Queued audio chunk, length={len(audio_b64)} base64 chars")
+    else:
+        print("No active WS when trying to send audio")
+
+async def piopiy_writer(client_ws, out_q: asyncio.Queue):
+    """Single writer per connection: drains what is queued and sends it back-to-back in one turn."""
+    while True:
+        batch = [await out_q.get()]
+        while len(batch) < PIOPIY_SEND_BATCH and not out_q.empty():
+            batch.append(out_q.get_nowait())
+        try:
+            for message in batch:
+                await client_ws.send(message)
+            print(f"Sent {len(batch)} audio chunk(s)")
         except Exception as e:
             print(f"Error sending audio: {e}")
+
+# ─── Fixed phrases ──────────────────────────────────────────────────────────
+
+# Greeting/exit audio in the call's own voice, synthesized ahead of the first call and
+# again whenever the agent_config file changes (watch_phrase_audio)
+PHRASE_WATCH_S = 2.0  # How often watch_phrase_audio stats the config file
+PHRASE_AUDIO: dict[str, str] = {}  # Text -> base64 8 kHz PCM, ready for playStream
+
+async def synthesize_phrase(text: str) -> str | None:
+    """Whole-utterance TTS through the same Google voice and resampler as live replies."""
+    loop = asyncio.get_running_loop()
+    state = None
+    parts = []
+    async for raw_chunk in ultra_fast_tts_stream(text):
+        processed, state = await loop.run_in_executor(DSP_POOL, stream_audio_convert, raw_chunk, state)
+        parts.append(processed)
+    if state is None:
+        return None
+    tail, _ = stream_audio_convert(b"", state, True)
+    parts.append(tail)
+    return binascii.b2a_base64(b"".join(parts), newline=False).decode()
+
+async def warm_phrase_audio():
+    """Synthesize the current greeting and exit, keeping audio for texts that did not change."""
+    global PHRASE_AUDIO
+    texts = (qa_bot.get_greeting_message(), qa_bot.get_exit_message())
+    missing = [t for t in texts if t not in PHRASE_AUDIO]
+    fresh = dict(zip(missing, await asyncio.gather(*(synthesize_phrase(t) for t in missing))))
+    PHRASE_AUDIO = {t: a for t in texts if (a := PHRASE_AUDIO.get(t) or fresh.get(t))}
+    print(f"Phrase audio ready for {len(PHRASE_AUDIO)}/{len(texts)} phrases")
+
+async def watch_phrase_audio(interval: float = PHRASE_WATCH_S):
+    """Warm the phrase audio, then re-warm it whenever agent_config's file signature changes (run as a task)."""
+    signature = agent_config.file_signature()
+    await warm_phrase_audio()
+    while True:
+        await asyncio.sleep(interval)
+        current = agent_config.file_signature()
+        if current != signature:
+            signature = current
+            await warm_phrase_audio()
+
+# ─── Response cache ─────────────────────────────────────────────────────────
+# Replies are reused for near-identical questions asked in the same context (the last
+# 4 history messages, all get_response sees besides the question, and the agent_config
+# file it answers from). Questions must share their content words; similarity is then
+# the cosine of cheap hashed word/bigram vectors, checked against every entry in one matmul.
+RESPONSE_CACHE_SIZE = 512
+RESPONSE_CACHE_MIN_SIMILARITY = 0.92
+EMBED_DIM = 512
+WORD_RE = re.compile(r"[a-z0-9']+")
+# Words that change an answer without moving the embedding much ("2 BHK" vs "3 BHK",
+# "is parking available" vs "is parking not available"); these must match exactly
+EXACT_WORDS = frozenset({
+    "no", "not", "never", "nothing", "none", "nobody", "nor", "without", "cannot",
+    "zero", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten",
+    "hundred", "thousand", "lakh", "lakhs", "crore", "crores", "million",
+})
+# Function words and filler that rephrasings add or drop; every other word ("flat" vs
+# "villa", "Andheri" vs "Thane", "under" vs "over") must be present in both questions
+STOP_WORDS = frozenset({
+    "a", "an", "the", "is", "are", "was", "were", "be", "am", "do", "does", "did",
+    "can", "could", "would", "will", "should", "may", "i", "i'm", "me", "my", "we", "our",
+    "you", "your", "it", "it's", "its", "this", "that", "there", "here", "what", "what's",
+    "which", "who", "when", "where", "how", "of", "in", "on", "at", "to", "for", "from",
+    "with", "about", "and", "or", "so", "if", "please", "tell", "know", "want", "like",
+    "just", "also", "any", "some", "okay", "ok", "hi", "hello", "um", "uh", "have", "has",
+    "get", "give", "show", "us",
+})
+
+_cache_embs = np.zeros((RESPONSE_CACHE_SIZE, EMBED_DIM), dtype=np.float32)
+_cache_ctx = np.zeros(RESPONSE_CACHE_SIZE, dtype=np.int64)
+_cache_replies: list[str | None] = [None] * RESPONSE_CACHE_SIZE
+_cache_lru: OrderedDict[int, None] = OrderedDict()  # Used slots, least recently used first
+
+def embed_utterance(text: str) -> np.ndarray:
+    """Unit-length hashed bag of words + bigrams for a user utterance."""
+    words = WORD_RE.findall(text.lower())
+    vec = np.zeros(EMBED_DIM, dtype=np.float32)
+    for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+        vec[zlib.crc32(feature.encode()) % EMBED_DIM] += 1.0
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
+
+def exact_words(text: str) -> tuple:
+    """Numbers and negations in an utterance, in order."""
+    return tuple(
+        w for w in WORD_RE.findall(text.lower())
+        if w in EXACT_WORDS or w.endswith("n't") or any(c.isdigit() for c in w)
+    )
+
+def content_words(text: str) -> frozenset:
+    """Words of an utterance other than STOP_WORDS, in any order."""
+    return frozenset(WORD_RE.findall(text.lower())) - STOP_WORDS
+
+def history_context(history: list, text: str) -> int:
+    """Cache key a reuse must share: config, recent turns, and the utterance's exact and content words."""
+    return hash((
+        agent_config.file_signature(),
+        tuple((m["role"], m["content"]) for m in history[-4:]),
+        exact_words(text),
+        content_words(text),
+    ))
+
+def cached_response(emb: np.ndarray, ctx: int) -> str | None:
+    """Closest cached reply from the same context, if similar enough."""
+    if not _cache_lru:
+        return None
+    sims = _cache_embs @ emb
+    sims[_cache_ctx != ctx] = -1.0
+    slot = int(np.argmax(sims))
+    if sims[slot] < RESPONSE_CACHE_MIN_SIMILARITY or _cache_replies[slot] is None:
+        return None
+    _cache_lru.move_to_end(slot)
+    return _cache_replies[slot]
+
+def cache_response(emb: np.ndarray, ctx: int, reply: str):
+    if not emb.any():
+        return
+    if len(_cache_lru) < RESPONSE_CACHE_SIZE:
+        slot = len(_cache_lru)
     else:
-        print("No active WS when trying to send audio")
+        slot, _ = _cache_lru.popitem(last=False)
+    _cache_embs[slot] = emb
+    _cache_ctx[slot] = ctx
+    _cache_replies[slot] = reply
+    _cache_lru[slot] = None
 
 # ─── Workers ────────────────────────────────────────────────────────────────
 async def ultra_fast_tts_worker():
     """TTS processing worker."""
+    # Reused for every converted chunk; each is encoded before the next overwrites it
+    pcm_scratch = np.empty(TTS_SCRATCH_SAMPLES, dtype=np.int16)
+    tts_q = current_call.get().tts_q
     while True:
         try:
-            if not tts_q.empty():
-                text = tts_q.get()
-                if text is None:
-                    break
-                print(f"TTS worker dequeued text: '{text[:80]}'")
-
-                raw_audio = await ultra_fast_tts(text)
-                if raw_audio:
-                    processed = await asyncio.get_event_loop().run_in_executor(None, fast_audio_convert, raw_audio)
-                    audio_b64 = base64.b64encode(processed).decode()
-                    print(f" Processed audio bytes: in={len(raw_audio)} -> out={len(processed)}")
-                    await send_audio_ultra_fast(audio_b64)
-                else:
-                    print(" No audio produced by TTS")
-
-            await asyncio.sleep(0.0005)
+            text = await tts_q.get()
+            if text is None:
+                break
+            print(f"TTS worker dequeued text: '{text[:80]}'")
+
+            # Greeting/exit were synthesized ahead of time, already 8 kHz PCM
+            audio_b64 = PHRASE_AUDIO.get(text)
+            if audio_b64:
+                await send_audio_ultra_fast(audio_b64)
+                print(f" Sent cached phrase audio: {len(audio_b64)} base64 chars")
+                continue
+
+            # Each downloaded chunk is resampled and sent while the rest is still arriving
+            # (converted straight into pcm_scratch and base64-encoded from there)
+            loop = asyncio.get_event_loop()
+            state = None
+            bytes_in = bytes_out = 0
+            async for raw_chunk in ultra_fast_tts_stream(text):
+                processed, state = await loop.run_in_executor(DSP_POOL, stream_audio_convert, raw_chunk, state, False, pcm_scratch)
+                bytes_in += len(raw_chunk)
+                if processed:
+                    bytes_out += len(processed)
+                    await send_audio_ultra_fast(binascii.b2a_base64(processed, newline=False).decode())
+            if state is None:
+                print(" No audio produced by TTS")
+                continue
+            tail, _ = stream_audio_convert(b"", state, True, pcm_scratch)
+            if tail:
+                bytes_out += len(tail)
+                await send_audio_ultra_fast(binascii.b2a_base64(tail, newline=False).decode())
+            print(f" Processed audio bytes: in={bytes_in} -> out={bytes_out}")
         except Exception as e:
             print(f"TTS worker error: {e}")
             await asyncio.sleep(0.1)  # Brief pause on error
 
 async def ultra_fast_llm_worker():
     """LLM processing worker."""
-    bot = RealEstateQA(ai_services)
+    bot = qa_bot
+    call = current_call.get()
+    transcript_q, tts_q = call.transcript_q, call.tts_q
     history = []
     session_started = False
     has_sent_greeting = False
 
     while True:
         try:
-            if not transcript_q.empty():
-                user_text = transcript_q.get()
-
-                # Mark session started on first user input (do not skip processing)
-                if not session_started:
-                    session_started = True
-                    await log_call_message("system", f"Session started. First user input: {user_text}")
-
-                # Log user transcription FIRST (before any processing)
-                await log_call_message("user", user_text)
-
-                # If we haven't greeted yet, send the configured greeting (from agent_config) and skip LLM
-                if not has_sent_greeting:
-                    try:
-                        greeting = bot.get_greeting_message()
-                        await log_call_message("greeting", greeting)
-                        tts_q.put(greeting)
-                        has_sent_greeting = True
-                        # Do not call LLM on the same turn to avoid duplicate greeting from model
-                        await asyncio.sleep(0)  # yield
-                        continue
-                    except Exception as e:
-                        print(f" Failed to send configured greeting: {e}")
-
-                # Check for exit intent
-                if bot.is_exit_intent(user_text):
-                    exit_message = bot.get_exit_message()
-                    await log_call_message("exit", exit_message)
-                    tts_q.put(exit_message)
-
-                    # End call tracking
-                    # await end_call_tracking()
-
-                    # Trigger call hangup after exit message
-                    await asyncio.sleep(3)  # Wait for exit message to be played
-                    await trigger_call_hangup()
-
-                    # Reset session
-                    session_started = False
-                    history = []
-                    has_sent_greeting = False
-                    continue
+            user_text = await transcript_q.get()
+
+            # Mark session started on first user input (do not skip processing)
+            if not session_started:
+                session_started = True
+                await log_call_message("system", f"Session started. First user input: {user_text}")
+
+            # Log user transcription FIRST (before any processing)
+            await log_call_message("user", user_text)
 
-                # Generate response with timeout
+            # If we haven't greeted yet, send the configured greeting (from agent_config) and skip LLM
+            if not has_sent_greeting:
                 try:
+                    greeting = bot.get_greeting_message()
+                    await log_call_message("greeting", greeting)
+                    tts_q.put_nowait(greeting)
+                    has_sent_greeting = True
+                    # Do not call LLM on the same turn to avoid duplicate greeting from model
+                    await asyncio.sleep(0)  # yield
+                    continue
+                except Exception as e:
+                    print(f" Failed to send configured greeting: {e}")
+
+            # Check for exit intent
+            if bot.is_exit_intent(user_text):
+                exit_message = bot.get_exit_message()
+                await log_call_message("exit", exit_message)
+                tts_q.put_nowait(exit_message)
+
+                # End call tracking
+                # await end_call_tracking()
+
+                # Trigger call hangup after exit message
+                await asyncio.sleep(3)  # Wait for exit message to be played
+                await trigger_call_hangup()
+
+                # Reset session
+                session_started = False
+                history = []
+                has_sent_greeting = False
+                continue
+
+            # Generate response with timeout (or reuse one given to a near-identical question)
+            try:
+                emb, ctx = embed_utterance(user_text), history_context(history, user_text)
+                reply = cached_response(emb, ctx)
+                if reply is not None:
+                    print(" LLM response served from cache")
+                else:
                     reply = await asyncio.wait_for(
-                        asyncio.get_event_loop().run_in_executor(None, bot.get_response, user_text, history),
+                        asyncio.get_event_loop().run_in_executor(LLM_POOL, bot.get_response, user_text, history),
                         timeout=10.0  # 10 second timeout
                     )
+                    # get_response swallows LLM errors and returns canned text; never cache that
+                    if not bot.is_fallback(user_text, reply):
+                        cache_response(emb, ctx, reply)
+
+                # Log bot response
+                await log_call_message("bot", reply)
+            except asyncio.TimeoutError:
+                print(" LLM response timeout, sending fallback")
+                reply = "I apologize, but I'm having trouble processing your request right now. Could you please try again?"
+                await log_call_message("bot", reply)
+            except Exception as e:
+                print(f" Error generating response: {e}")
+                print(f" Error type: {type(e).__name__}")
+                print(f" Full error details: {str(e)}")
+
+                # Check if it's an API key issue
+                if "api_key" in str(e).lower() or "authentication" in str(e).lower():
+                    reply = "I'm sorry, there's an authentication issue with my AI service. Please check the API configuration."
+                elif "connection" in str(e).lower() or "timeout" in str(e).lower():
+                    reply = "I'm sorry, I'm having trouble connecting to my AI service. Please try again."
+                else:
+                    reply = "I'm sorry, I encountered an error. Please try again."
 
-                    # Log bot response
-                    await log_call_message("bot", reply)
-                except asyncio.TimeoutError:
-                    print(" LLM response timeout, sending fallback")
-                    reply = "I apologize, but I'm having trouble processing your request right now. Could you please try again?"
-                    await log_call_message("bot", reply)
-                except Exception as e:
-                    print(f" Error generating response: {e}")
-                    print(f" Error type: {type(e).__name__}")
-                    print(f" Full error details: {str(e)}")
-
-                    # Check if it's an API key issue
-                    if "api_key" in str(e).lower() or "authentication" in str(e).lower():
-                        reply = "I'm sorry, there's an authentication issue with my AI service. Please check the API configuration."
-                    elif "connection" in str(e).lower() or "timeout" in str(e).lower():
-                        reply = "I'm sorry, I'm having trouble connecting to my AI service. Please try again."
-                    else:
-                        reply = "I'm sorry, I encountered an error. Please try again."
-
-                    await log_call_message("bot", reply)
-
-                # Queue TTS
-                tts_q.put(reply)
-
-                # Update history
-                history.extend([
-                    {"role": "user", "content": user_text},
-                    {"role": "assistant", "content": reply}
-                ])
-
-                # Keep history manageable
-                if len(history) > 8:
-                    history = history[-6:]
-
-            await asyncio.sleep(0.0001)  # Reduced sleep time for faster response
+                await log_call_message("bot", reply)
+
+            # Queue TTS
+            tts_q.put_nowait(reply)
+
+            # Update history
+            history.extend([
+                {"role": "user", "content": user_text},
+                {"role": "assistant", "content": reply}
+            ])
+
+            # Keep history manageable
+            if len(history) > 8:
+                history = history[-6:]
         except Exception as e:
             print(f"LLM worker error: {e}")
             await asyncio.sleep(0.1)  # Brief pause on error
 
 # ─── Deepgram ───────────────────────────────────────────────────────────────
 
-def start_fast_deepgram():
-    """Minimal Deepgram client."""
-    global dg_ws_client
-
-    def on_open(ws):
-        def keep_alive():
-            while ws.sock and ws.sock.connected:
-                try:
-                    ws.send('{"type":"KeepAlive"}')
-                    time.sleep(8)
-                except:
-                    break
-        threading.Thread(target=keep_alive, daemon=True).start()
-
-    def on_message(ws, message):
-        try:
-            data = json.loads(message)
-            if data.get("type") == "Results":
-                transcript = data.get("channel", {}).get("alternatives", [{}])[0].get("transcript", "")
-                # Robust final detection across Deepgram variants
-                is_final = (
-                    bool(data.get("is_final"))
-                    or bool(data.get("speech_final"))
-                    or bool(data.get("final"))
-                    or bool(data.get("channel", {}).get("is_final"))
-                    or bool(data.get("channel", {}).get("alternatives", [{}])[0].get("final"))
-                )
-                if transcript:
-                    # Print ASR transcript for debugging
-                    print(f"ASR: {transcript}{' (final)' if is_final else ' (partial)'}")
-                # Only enqueue final transcripts to reduce partials
-                if transcript and is_final:
-                    transcript_q.put(transcript)
-        except Exception as e:
-            print(f" Deepgram message parse error: {e}")
-
-    def on_error(ws, error):
-        print(f" Deepgram WS error: {error}")
+def handle_deepgram_message(message, transcript_q: asyncio.Queue):
+    """Parse one Deepgram result and queue final transcripts for the LLM worker."""
+    try:
+        data = orjson.loads(message)
+        if data.get("type") == "Results":
+            transcript = data.get("channel", {}).get("alternatives", [{}])[0].get("transcript", "")
+            # Robust final detection across Deepgram variants
+            is_final = (
+                bool(data.get("is_final"))
+                or bool(data.get("speech_final"))
+                or bool(data.get("final"))
+                or bool(data.get("channel", {}).get("is_final"))
+                or bool(data.get("channel", {}).get("alternatives", [{}])[0].get("final"))
+            )
+            if transcript:
+                # Print ASR transcript for debugging
+                print(f"ASR: {transcript}{' (final)' if is_final else ' (partial)'}")
+            # Only enqueue final transcripts to reduce partials
+            if transcript and is_final:
+                transcript_q.put_nowait(transcript)
+    except Exception as e:
+        print(f" Deepgram message parse error: {e}")
 
-    def on_close(ws, close_status_code, close_msg):
-        print(f"Deepgram WS closed: {close_status_code} {close_msg}")
+async def deepgram_keep_alive(ws):
+    """Send a KeepAlive every 8s so Deepgram doesn't drop the stream during silence."""
+    while True:
+        await asyncio.sleep(8)
+        await ws.send('{"type":"KeepAlive"}')
 
+async def deepgram_session():
+    """Minimal Deepgram client for the current call, read on the event loop alongside its handler."""
+    call = current_call.get()
     headers = {"Authorization": f"Token {DEEPGRAM_API_KEY}"}
-    dg_ws_client = websocket.WebSocketApp(
-        DG_WS_URL,
-        header=headers,
-        on_open=on_open,
-        on_message=on_message,
-        on_close=on_close,
-        on_error=on_error
-    )
-    threading.Thread(target=dg_ws_client.run_forever, daemon=True).start()
+    try:
+        async with ws_connect(DG_WS_URL, additional_headers=headers, max_size=None, compression=None) as ws:
+            call.dg_ws = ws
+            call.dg_ready.set()
+            keep_alive_task = asyncio.create_task(deepgram_keep_alive(ws))
+            try:
+                async for message in ws:
+                    handle_deepgram_message(message, call.transcript_q)
+            finally:
+                keep_alive_task.cancel()
+            print(f"Deepgram WS closed: {ws.close_code} {ws.close_reason}")
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        print(f" Deepgram WS error: {e}")
+    finally:
+        call.dg_ws = None
+        call.dg_ready.set()
 
 # ─── WebSocket handler ──────────────────────────────────────────────────────
 
-async def ultra_fast_client_handler(client_ws):
-    """Ultra-fast client handler."""
-    global piopiy_ws
-    piopiy_ws = client_ws
-
-    print(f" WebSocket client connected from: {client_ws.remote_address}")
-
+async def begin_call_tracking(client_ws) -> str | None:
+    """Start tracking for a new connection, linked to its call record when one can be found."""
     # Extract session info from connection to link with existing call record
     session_id = None
     extracted_phone = None
     extracted_lead_id = None
 
     try:
-        # Extract from path/query params if present
-        path = getattr(client_ws, "path", "") or ""
+        # Extract from path/query params if present; websockets' ServerConnection keeps
+        # them on its handshake request, legacy protocol objects on .path
+        request = getattr(client_ws, "request", None)
+        path = getattr(request, "path", None) or getattr(client_ws, "path", "") or ""
         if "?" in path:
             from urllib.parse import parse_qs, urlparse
             qs = parse_qs(urlparse(path).query)
@@ -564,10 +871,13 @@ async def ultra_fast_client_handler(client_ws):
             try:
                 from datetime import timedelta
                 two_minutes_ago = datetime.now() - timedelta(minutes=2)
-                recent_call = mongo_client.calls.find_one({
-                    "status": "initiated",
-                    "created_at": {"$gte": two_minutes_ago}
-                }, sort=[("created_at", -1)])
+                recent_call = await asyncio.get_running_loop().run_in_executor(
+                    IO_POOL,
+                    lambda: mongo_client.calls.find_one({
+                        "status": "initiated",
+                        "created_at": {"$gte": two_minutes_ago}
+                    }, {"phone_number": 1, "lead_id": 1}, sort=[("created_at", -1)])
+                )
 
                 if recent_call:
                     recent_phone = recent_call.get("phone_number", "unknown")
@@ -579,92 +889,135 @@ async def ultra_fast_client_handler(client_ws):
         # Create new tracking with context from recent call if available
         await start_call_tracking(phone_number=recent_phone, lead_id=recent_lead_id, call_session_id=None)
 
-    # Start workers
-    tts_task = asyncio.create_task(ultra_fast_tts_worker())
-    llm_task = asyncio.create_task(ultra_fast_llm_worker())
-
-    # Removed proactive greeting to avoid double greeting and to wait for user speech
+    return session_id
 
+async def handle_client_text(message: str, call: CallState, session_id: str | None):
+    """Apply call context (phone, lead, session) from a Piopiy text frame."""
+    # Try to parse text frames for control/metadata
     try:
-        async for message in client_ws:
-            if isinstance(message, bytes):
-                if dg_ws_client and dg_ws_client.sock and dg_ws_client.sock.connected:
-                    dg_ws_client.send(message, websocket.ABNF.OPCODE_BINARY)
-            else:
-                # Try to parse text frames for control/metadata
-                try:
-                    print(f"Received text message: {message[:200]}...")  # Log first 200 chars
-                    data = json.loads(message)
-                    print(f"Parsed JSON: {data}")
-
-                    # Accept either a wrapper or direct fields
-                    meta = data.get("meta") if isinstance(data, dict) else None
-                    if not meta and isinstance(data, dict):
-                        meta = data
-
-                    # Check for extra_params from Piopiy
-                    extra_params = data.get("extra_params")
-                    if extra_params:
-                        print(f" Found extra_params: {extra_params}")
-                        phone = extra_params.get("phone_number")
-                        lead_id = extra_params.get("lead_id")
-                        sess = extra_params.get("session")
-
-                        if phone:
-                            current_call_data["phone_number"] = str(phone)
-                        if lead_id:
-                            current_call_data["lead_id"] = str(lead_id)
-                        if sess:
-                            current_call_data["call_session_id"] = str(sess)
-                        await log_call_message("system", f"Call context from extra_params: phone={phone}, lead_id={lead_id}, session={sess}")
-
-                    # Also check meta format
-                    if isinstance(meta, dict):
-                        phone = meta.get("phone_number") or meta.get("phone")
-                        lead_id = meta.get("lead_id")
-                        sess = meta.get("session") or meta.get("sid") or meta.get("call_session_id") or session_id
-
-                        # Update call context with proper phone/lead info
-                        if phone:
-                            current_call_data["phone_number"] = str(phone)
-                        if lead_id:
-                            current_call_data["lead_id"] = str(lead_id)
-                        if sess:
-                            current_call_data["call_session_id"] = str(sess)
-                        await log_call_message("system", f"Call context from meta: phone={phone}, lead_id={lead_id}, session={sess}")
+        print(f"Received text message: {message[:200]}...")  # Log first 200 chars
+        data = orjson.loads(message)
+        print(f"Parsed JSON: {data}")
+
+        # Accept either a wrapper or direct fields
+        meta = data.get("meta") if isinstance(data, dict) else None
+        if not meta and isinstance(data, dict):
+            meta = data
+
+        # Check for extra_params from Piopiy
+        extra_params = data.get("extra_params")
+        if extra_params:
+            print(f" Found extra_params: {extra_params}")
+            phone = extra_params.get("phone_number")
+            lead_id = extra_params.get("lead_id")
+            sess = extra_params.get("session")
+
+            if phone:
+                call.phone_number = str(phone)
+            if lead_id:
+                call.lead_id = str(lead_id)
+            if sess:
+                call.call_session_id = str(sess)
+            await log_call_message("system", f"Call context from extra_params: phone={phone}, lead_id={lead_id}, session={sess}")
+
+        # Also check meta format
+        if isinstance(meta, dict):
+            phone = meta.get("phone_number") or meta.get("phone")
+            lead_id = meta.get("lead_id")
+            sess = meta.get("session") or meta.get("sid") or meta.get("call_session_id") or session_id
+
+            # Update call context with proper phone/lead info
+            if phone:
+                call.phone_number = str(phone)
+            if lead_id:
+                call.lead_id = str(lead_id)
+            if sess:
+                call.call_session_id = str(sess)
+            await log_call_message("system", f"Call context from meta: phone={phone}, lead_id={lead_id}, session={sess}")
 
-                except Exception as e:
-                    # Log but don't fail on non-JSON text frames
-                    print(f"Failed to parse text frame: {e}")
-                    pass
     except Exception as e:
-        print(f" WebSocket connection error: {e}")
-    finally:
-        print(" WebSocket client disconnected - ending call tracking")
-        # Always end call tracking to save any conversation data
-        await end_call_tracking()
+        # Log but don't fail on non-JSON text frames
+        print(f"Failed to parse text frame: {e}")
+        pass
 
-        tts_task.cancel()
-        llm_task.cancel()
-        try:
-            await tts_task
-            await llm_task
-        except asyncio.CancelledError:
-            pass
-        piopiy_ws = None
+async def receive_client_frames(client_ws, call: CallState, session_id: str | None):
+    """Forward caller audio to Deepgram until the caller hangs up; the rare text frames go to handle_client_text."""
+    dg_ws = call.dg_ws  # Fixed for the call; None if Deepgram failed to connect
+    async for message in client_ws:
+        if type(message) is bytes:
+            if dg_ws is not None:
+                try:
+                    await dg_ws.send(message)
+                except websockets.ConnectionClosed:
+                    dg_ws = None  # Deepgram went away; keep the call up but stop forwarding
+        else:
+            await handle_client_text(message, call, session_id)
+
+async def ultra_fast_client_handler(client_ws):
+    """Ultra-fast client handler."""
+    # Each connection runs in its own task, so this only affects this call and its workers
+    call = CallState(client_ws=client_ws)
+    current_call.set(call)
+
+    print(f" WebSocket client connected from: {client_ws.remote_address}")
+
+    try:
+        async with asyncio.TaskGroup() as tg:
+            # The workers loop until cancelled; leaving the group waits for all of them to stop
+            call_tasks = [
+                tg.create_task(piopiy_writer(client_ws, call.out_q)),
+                tg.create_task(deepgram_session()),  # Connects while the call record is looked up
+            ]
+            try:
+                session_id = await begin_call_tracking(client_ws)
+
+                # Start workers
+                call_tasks.append(tg.create_task(ultra_fast_tts_worker()))
+                call_tasks.append(tg.create_task(ultra_fast_llm_worker()))
+
+                # Removed proactive greeting to avoid double greeting and to wait for user speech
+
+                # Caller audio waits in the socket until this call's Deepgram stream is up (or has failed)
+                await call.dg_ready.wait()
+                await receive_client_frames(client_ws, call, session_id)
+            except Exception as e:
+                print(f" WebSocket connection error: {e}")
+            finally:
+                print(" WebSocket client disconnected - ending call tracking")
+                # Always end call tracking to save any conversation data
+                await end_call_tracking()
+                for task in call_tasks:
+                    task.cancel()
+    finally:
+        call.client_ws = None
 
 # ─── Main ───────────────────────────────────────────────────────────────────
 
 async def ultra_fast_main():
     """Ultra-fast main entry point."""
-    start_fast_deepgram()
-    await asyncio.sleep(1)
-
-    server = await websockets.serve(ultra_fast_client_handler, "localhost", 8765)
-    print("Voice Bot running at ws://localhost:8765")
-    await server.wait_closed()
+    phrase_task = asyncio.create_task(watch_phrase_audio()) if GOOGLE_API_KEY else None
+    server = await websockets.serve(
+        ultra_fast_client_handler, "localhost", WEBSOCKET_PORT,
+        compression=None,  # Piopiy frames are PCM; deflate just burns CPU on every chunk
+        max_size=2**23,
+        max_queue=64,
+        write_limit=2**18,
+        ping_interval=20,
+        ping_timeout=60,
+    )
+    print(f"Voice Bot running at ws://localhost:{WEBSOCKET_PORT}")
+    try:
+        await server.wait_closed()
+    finally:
+        # Let calls that already hung up finish saving before the process exits
+        await _finalization_q.join()
+        if phrase_task is not None:
+            phrase_task.cancel()
+        await TTS_CLIENT.aclose()
 
 if __name__ == "__main__":
+    if uvloop:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
     try:
         asyncio.run(ultra_fast_main())
     except KeyboardInterrupt: